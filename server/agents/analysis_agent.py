@@ -1,10 +1,17 @@
-from typing import Dict, Any, List
+import asyncio
+from typing import Dict, Any, List, Tuple
 from langchain.schema import BaseMessage
 from langchain_core.runnables import RunnableConfig
-import pandas as pd
 import numpy as np
 from .base_agent import BaseAgent
+from .cpu_executor import CPUExecutor
+from .indicators import build_price_matrix, compute_indicators, indicators_to_records
+from .indicator_state import IndicatorState, IndicatorStateStore, advance_states, rebuild_states
 from .llm_client import LLMClient  # Fixed import path
+from .micro_batcher import MicroBatcher
+
+# Keys of AnalysisAgent.run()'s inputs that are not symbols
+NON_SYMBOL_INPUTS = ('preferences', 'ai_settings', 'timeframe', 'llm_symbols')
 
 class AnalysisAgent(BaseAgent):
     """Agent responsible for analyzing stock market data and calculating metrics."""
@@ -12,119 +19,141 @@ class AnalysisAgent(BaseAgent):
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         self.metrics = self.config['metrics']
-        self.llm_client = LLMClient()
+        self.llm_batch_size = self.config.get('llm_batch_size', 1)
+        self.llm_client = LLMClient(
+            max_concurrency=self.config.get('llm_concurrency', 5),
+            cache_config=self.config.get('llm_cache'),
+            batch_size=self.llm_batch_size,
+            batch_linger_seconds=self.config.get('llm_batch_linger_seconds', 0.05)
+        )
+        state_config = self.config.get('indicator_state', {})
+        self.indicator_store = IndicatorStateStore(state_config) if state_config.get('enabled') else None
+        self.indicator_batch_size = self.config.get('indicator_batch_size', 500)
+        self.executor = CPUExecutor(self.config.get('executor'))
+        self.indicator_batcher = MicroBatcher(
+            self._gathered_indicators, self.indicator_batch_size, self.config.get('indicator_batch_linger_seconds', 0.01)
+        )
     
     async def run(self, inputs: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+        """Analyze processed data for all symbols.
+        
+        Indicators of symbols analyzed concurrently on the same timeframe, e.g.
+        by the per-symbol paths of one or several workflow runs, are computed
+        together, in batches of up to indicator_batch_size.
+        
+        Args:
+            inputs (Dict[str, Any]): Processed column arrays keyed by symbol, plus
+                preferences, ai_settings, timeframe and optionally llm_symbols, the
+                symbols to analyze with the LLM (the first 5 by default)
+            config (RunnableConfig): Configuration for the execution
+            
+        Returns:
+            Dict[str, Any]: Indicators and LLM analyses keyed by symbol
+        """
         analysis_results = {}
-        preferences = inputs.get('preferences', {})
         ai_settings = inputs.get('ai_settings', {})
         
         print(f"[AnalysisAgent] Starting analysis with AI settings: {ai_settings}")
         
-        # Process stocks based on preferences
-        stock_count = 0
-        for api, data in inputs.items():
-            if stock_count >= 5  or api in ['ai_settings']:
-                break
-                
-            try:
-                
-                print(f"[AnalysisAgent] Calling LLM for {api} with data: {preferences}")
-                llm_analysis = await self.llm_client.analyze_stock(preferences, ai_settings)
-                print(f"[AnalysisAgent] LLM analysis for {api}: {llm_analysis}")
-                
-                analysis_results[api] = {
-                    'llm_analysis': llm_analysis
-                }
-                stock_count += 1
-                
-            except Exception as e:
-                error_msg = f"Error analyzing {api}: {str(e)}"
+        timeframe = inputs.get('timeframe', '1d')
+        batch = {key: value for key, value in inputs.items() if key not in NON_SYMBOL_INPUTS}
+        
+        # Analyze the requested stocks, by default the first 5, all LLM calls running concurrently
+        llm_symbols = inputs.get('llm_symbols')
+        if llm_symbols is None:
+            symbols = list(batch)[:5]
+        else:
+            symbols = [symbol for symbol in batch if symbol in llm_symbols]
+        llm_tasks = [
+            asyncio.ensure_future(self._analyze_symbol(symbol, batch[symbol], ai_settings))
+            for symbol in symbols
+        ]
+        
+        try:
+            # Technical indicators, gathered with other runs' symbols on the same timeframe
+            series = {symbol: data for symbol, data in batch.items() if isinstance(data, dict)}
+            indicators = await asyncio.gather(*(
+                self.indicator_batcher.submit(timeframe, symbol, data) for symbol, data in series.items()
+            ))
+        except BaseException:
+            for task in llm_tasks:
+                task.cancel()
+            raise
+        for symbol, symbol_indicators in zip(series, indicators):
+            analysis_results[symbol] = dict(symbol_indicators)
+        
+        llm_analyses = await asyncio.gather(*llm_tasks, return_exceptions=True)
+        
+        for symbol, llm_analysis in zip(symbols, llm_analyses):
+            if isinstance(llm_analysis, Exception):
+                error_msg = f"Error analyzing {symbol}: {str(llm_analysis)}"
                 print(f"[AnalysisAgent] {error_msg}")
-                self.update_state(f'error_analysis_{api}', error_msg)
+                self.update_state(f'error_analysis_{symbol}', error_msg)
+                continue
+            
+            print(f"[AnalysisAgent] LLM analysis for {symbol}: {llm_analysis}")
+            analysis_results.setdefault(symbol, {})['llm_analysis'] = llm_analysis
         
         return analysis_results
     
-    def _calculate_momentum(self, df: pd.DataFrame) -> Dict[str, float]:
-        """Calculate price momentum indicators."""
-        try:
-            # Calculate 14-day momentum
-            df['momentum'] = df['close'].diff(14)
-            return {
-                'momentum_14d': df['momentum'].mean(),
-                'momentum_trend': 'positive' if df['momentum'].mean() > 0 else 'negative'
-            }
-        except Exception:
-            return {}
+    async def _gathered_indicators(self, timeframe: str, series: Dict[str, Dict[str, np.ndarray]]) -> Dict[str, Dict[str, Any]]:
+        """Compute a gathered batch's indicators, from the stored states if enabled."""
+        if self.indicator_store is not None:
+            return await self._update_indicators(timeframe, series)
+        return await self._compute_indicators(series)
     
-    def _analyze_volume(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Analyze trading volume patterns."""
-        try:
-            avg_volume = df['volume'].mean()
-            volume_trend = df['volume'].rolling(window=5).mean()
-            return {
-                'average_volume': avg_volume,
-                'volume_trend': 'increasing' if volume_trend.iloc[-1] > volume_trend.iloc[0] else 'decreasing'
-            }
-        except Exception:
-            return {}
+    async def _compute_indicators(self, series: Dict[str, Dict[str, np.ndarray]]) -> Dict[str, Dict[str, Any]]:
+        """Compute the configured metrics on the executor, one price matrix per batch of symbols."""
+        batches = await self.executor.map_batches(_batch_indicators, series, self.indicator_batch_size, self.metrics)
+        return {symbol: indicators for batch in batches for symbol, indicators in batch.items()}
     
-    def _calculate_volatility(self, df: pd.DataFrame) -> Dict[str, float]:
-        """Calculate price volatility metrics."""
-        try:
-            # Calculate daily returns
-            daily_returns = df['close'].pct_change()
-            return {
-                'volatility': daily_returns.std() * np.sqrt(252),  # Annualized volatility
-                'avg_daily_range': (df['high'] - df['low']).mean()
-            }
-        except Exception:
-            return {}
+    async def _update_indicators(self, timeframe: str, series: Dict[str, Dict[str, np.ndarray]]) -> Dict[str, Dict[str, Any]]:
+        """Advance the stored indicator states by the new bars and read the metrics from them.
+        
+        Symbols without a usable state get their metrics from the vectorized
+        engine instead, on the executor, which rebuilds their states as well.
+        """
+        states = await asyncio.to_thread(self.indicator_store.get_many, timeframe, list(series))
+        states, stale = await asyncio.to_thread(advance_states, states, series)
+        indicators = {symbol: state.snapshot(self.metrics) for symbol, state in states.items()}
+        if stale:
+            batches = await self.executor.map_batches(_rebuild_batch, stale, self.indicator_batch_size, self.metrics)
+            for batch_indicators, batch_states in batches:
+                indicators.update(batch_indicators)
+                states.update(batch_states)
+        print(f"[AnalysisAgent] Indicator states: {len(states) - len(stale)} updated incrementally, {len(stale)} rebuilt")
+        await asyncio.to_thread(self.indicator_store.set_many, timeframe, states)
+        return indicators
     
-    def _calculate_moving_averages(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Calculate various moving averages."""
-        try:
-            ma_20 = df['close'].rolling(window=20).mean().iloc[-1]
-            ma_50 = df['close'].rolling(window=50).mean().iloc[-1]
-            ma_200 = df['close'].rolling(window=200).mean().iloc[-1]
-            
-            return {
-                'ma_20': ma_20,
-                'ma_50': ma_50,
-                'ma_200': ma_200,
-                'trend': self._determine_trend(ma_20, ma_50, ma_200)
-            }
-        except Exception:
-            return {}
+    async def _analyze_symbol(self, symbol: str, data: Any, ai_settings: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the LLM analysis for a single symbol."""
+        stock_data = self._summarize_stock(symbol, data)
+        print(f"[AnalysisAgent] Calling LLM for {symbol} with data: {stock_data}")
+        if self.llm_batch_size > 1:
+            # Batched mode packs this symbol into one LLM call with others analyzed at the same time
+            return await self.llm_client.analyze_stock_batched(stock_data, ai_settings)
+        return await self.llm_client.analyze_stock(stock_data, ai_settings)
     
-    def _calculate_relative_strength(self, df: pd.DataFrame) -> Dict[str, float]:
-        """Calculate relative strength indicators."""
-        try:
-            # Calculate 14-day RSI
-            delta = df['close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-            rs = gain / loss
-            rsi = 100 - (100 / (1 + rs))
-            
-            return {
-                'rsi': rsi.iloc[-1],
-                'rsi_trend': 'overbought' if rsi.iloc[-1] > 70 else 'oversold' if rsi.iloc[-1] < 30 else 'neutral'
-            }
-        except Exception:
-            return {}
+    def _summarize_stock(self, symbol: str, data: Any) -> Dict[str, Any]:
+        """Extract the prompt fields for a symbol from its processed bar columns."""
+        summary = {'symbol': symbol}
+        close = data.get('close') if isinstance(data, dict) else None
+        if close is not None and len(close):
+            # Stored prices may be float32; rounding keeps the prompt free of float noise
+            first, last = round(float(close[0]), 4), round(float(close[-1]), 4)
+            summary['price'] = last
+            if 'volume' in data:
+                summary['volume'] = float(data['volume'][-1])
+            if first:
+                summary['change'] = round((last - first) / first * 100, 2)
+        return summary
     
-    def _determine_trend(self, ma_20: float, ma_50: float, ma_200: float) -> str:
-        """Determine overall trend based on moving averages."""
-        if ma_20 > ma_50 > ma_200:
-            return 'strong_uptrend'
-        elif ma_20 > ma_50 and ma_50 < ma_200:
-            return 'potential_reversal_up'
-        elif ma_20 < ma_50 < ma_200:
-            return 'strong_downtrend'
-        elif ma_20 < ma_50 and ma_50 > ma_200:
-            return 'potential_reversal_down'
-        return 'neutral'
+    async def aclose(self) -> None:
+        """Close the LLM client, the indicator state store and the executor."""
+        await self.llm_client.aclose()
+        if self.indicator_store is not None:
+            self.indicator_store.close()
+        self.executor.shutdown()
     
     def process_message(self, message: BaseMessage) -> Dict[str, Any]:
         """Process messages from other agents containing data for analysis.
@@ -138,4 +167,14 @@ class AnalysisAgent(BaseAgent):
         content = message.content
         if isinstance(content, dict):
             return self.run(content, RunnableConfig())
-        return {}
\ No newline at end of file
+        return {}
+
+def _batch_indicators(batch: Dict[str, Dict[str, np.ndarray]], metrics: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Compute the metrics for a batch of symbols over one price matrix; runs on a CPUExecutor worker."""
+    symbols, matrix = build_price_matrix(batch)
+    return indicators_to_records(symbols, compute_indicators(matrix, metrics))
+
+def _rebuild_batch(batch: Dict[str, Dict[str, np.ndarray]], metrics: List[str]
+                   ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, IndicatorState]]:
+    """Compute a batch's metrics and build its indicator states; runs on a CPUExecutor worker."""
+    return _batch_indicators(batch, metrics), rebuild_states(batch)
@@ -0,0 +1,356 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+import numpy as np
+
+# Column files of the store and their fixed-width types. Prices are float32,
+# half the size of float64: about 7 significant digits, finer than a cent up
+# to $100,000. Views keep that type, so processing and analysis see float32
+# columns; they widen to float64 only where new arrays are built anyway, when
+# the price matrix is filled and when normalized columns are computed.
+COLUMN_TYPES = {
+    'timestamp': np.int64,
+    'open': np.float32,
+    'high': np.float32,
+    'low': np.float32,
+    'close': np.float32,
+    'volume': np.int64,
+}
+
+class MmapBarStore:
+    """Memory-mapped columnar store of OHLCV bars.
+
+    Each provider and interval has one flat file per column with fixed-width
+    values. Every symbol owns a contiguous region in those files, found
+    through a symbol -> (offset, length, capacity) index kept in SQLite.
+    Appending newer bars writes into the region's spare capacity. Stored bars
+    are never written over: a region that runs full, a revised last bar or a
+    backfill of older bars is written to a fresh region, so views handed out
+    earlier keep their values. The old region goes on a free list and is
+    reused for new regions once reuse_after_seconds have passed, longer than
+    any request holds on to a view; only when no freed region fits do the
+    files grow.
+
+    Reads return read-only NumPy views of the mapped files, so callers never
+    copy bars and every process using the store shares the same pages in the
+    OS page cache. Prices are stored as float32; see COLUMN_TYPES. Writers
+    in different processes are serialized by the index database.
+
+    Methods are blocking; call them from a worker thread inside async code.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """Initialize the store and create its index if needed.
+
+        Args:
+            config (Dict[str, Any]): The cache 'bar_store' configuration
+        """
+        self.path = config['path']
+        self.initial_capacity = config.get('initial_capacity', 256)
+        self.reuse_after_seconds = config.get('reuse_after_seconds', 300)
+        self._lock = threading.Lock()
+        self._maps: Dict[Tuple[str, str, str], np.memmap] = {}
+
+        os.makedirs(self.path, exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(self.path, 'index.sqlite3'), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS regions (
+                provider TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                capacity INTEGER NOT NULL,
+                PRIMARY KEY (provider, interval, symbol)
+            )'''
+        )
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS partitions (
+                provider TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                rows INTEGER NOT NULL,
+                PRIMARY KEY (provider, interval)
+            )'''
+        )
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS free_regions (
+                provider TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                capacity INTEGER NOT NULL,
+                freed_at REAL NOT NULL,
+                PRIMARY KEY (provider, interval, offset)
+            )'''
+        )
+
+    def append(self, provider: str, symbol: str, interval: str, bars: Dict[str, np.ndarray]) -> int:
+        """Merge bars into a symbol's series; bars with a stored timestamp replace it.
+
+        Args:
+            provider (str): Provider name
+            symbol (str): Ticker symbol
+            interval (str): Bar interval
+            bars (Dict[str, np.ndarray]): One array per column in COLUMN_TYPES
+
+        Returns:
+            int: Number of bars stored for the symbol afterwards
+        """
+        new = _typed_columns(bars)
+        with self._lock:
+            if not len(new['timestamp']):
+                region = self._conn.execute(
+                    'SELECT length FROM regions WHERE provider = ? AND interval = ? AND symbol = ?',
+                    (provider, interval, symbol)
+                ).fetchone()
+                return region[0] if region is not None else 0
+            # BEGIN IMMEDIATE takes the database write lock, serializing writers across processes
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                region = self._conn.execute(
+                    'SELECT offset, length, capacity FROM regions WHERE provider = ? AND interval = ? AND symbol = ?',
+                    (provider, interval, symbol)
+                ).fetchone()
+                offset, length, capacity = region if region is not None else (0, 0, 0)
+                stored_ts = self._column(provider, interval, 'timestamp', offset + length)[offset:offset + length]
+
+                if length and new['timestamp'][0] >= stored_ts[-1]:
+                    # Newer bars only: the last stored bar may be revised, the rest is appended
+                    start = length
+                    if new['timestamp'][0] == stored_ts[-1]:
+                        if _same_bar(self._read(provider, interval, offset + length - 1, 1), new):
+                            new = {name: values[1:] for name, values in new.items()}
+                        else:
+                            start = length - 1
+                    total = start + len(new['timestamp'])
+                    if start == length and total <= capacity:
+                        # Spare capacity lies past every view handed out so far
+                        self._write(provider, interval, offset + start, new)
+                    else:
+                        # Views of the stored bars must not change, so a revised or
+                        # overflowing series moves to a fresh region
+                        kept = self._read(provider, interval, offset, start)
+                        old_region = (offset, capacity)
+                        offset, capacity = self._allocate(
+                            provider, interval, capacity if total <= capacity else max(2 * capacity, total)
+                        )
+                        self._write(provider, interval, offset, _concat(kept, new))
+                        self._release(provider, interval, *old_region)
+                    length = total
+                else:
+                    # A first load or a backfill goes to a fresh region
+                    merged = _merge(self._read(provider, interval, offset, length), new) if length else new
+                    old_region = (offset, capacity)
+                    length = len(merged['timestamp'])
+                    offset, capacity = self._allocate(provider, interval, max(self.initial_capacity, 2 * length))
+                    self._write(provider, interval, offset, merged)
+                    self._release(provider, interval, *old_region)
+
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO regions VALUES (?, ?, ?, ?, ?, ?)',
+                    (provider, interval, symbol, offset, length, capacity)
+                )
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return length
+
+    def load(self, provider: str, symbol: str, interval: str, start_ts: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Get a symbol's stored bars as read-only views of the mapped files.
+
+        Args:
+            provider (str): Provider name
+            symbol (str): Ticker symbol
+            interval (str): Bar interval
+            start_ts (Optional[int]): Only return bars at or after this epoch-millisecond time
+
+        Returns:
+            Dict[str, np.ndarray]: One array per column in COLUMN_TYPES, in time order
+        """
+        with self._lock:
+            region = self._conn.execute(
+                'SELECT offset, length FROM regions WHERE provider = ? AND interval = ? AND symbol = ?',
+                (provider, interval, symbol)
+            ).fetchone()
+            if region is None:
+                return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMN_TYPES.items()}
+            columns = self._read(provider, interval, *region)
+        if start_ts is not None:
+            first = int(np.searchsorted(columns['timestamp'], start_ts))
+            columns = {name: values[first:] for name, values in columns.items()}
+        return columns
+
+    def _read(self, provider: str, interval: str, offset: int, length: int) -> Dict[str, np.ndarray]:
+        columns = {}
+        for name in COLUMN_TYPES:
+            view = self._column(provider, interval, name, offset + length)[offset:offset + length]
+            view.flags.writeable = False
+            columns[name] = view
+        return columns
+
+    def _write(self, provider: str, interval: str, offset: int, columns: Dict[str, np.ndarray]) -> None:
+        length = len(columns['timestamp'])
+        for name in COLUMN_TYPES:
+            self._column(provider, interval, name, offset + length)[offset:offset + length] = columns[name]
+
+    def delete(self, provider: str, symbol: str, interval: str) -> None:
+        """Drop a symbol's series; its region is freed for reuse.
+
+        Args:
+            provider (str): Provider name
+            symbol (str): Ticker symbol
+            interval (str): Bar interval
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                region = self._conn.execute(
+                    'SELECT offset, capacity FROM regions WHERE provider = ? AND interval = ? AND symbol = ?',
+                    (provider, interval, symbol)
+                ).fetchone()
+                if region is not None:
+                    self._conn.execute(
+                        'DELETE FROM regions WHERE provider = ? AND interval = ? AND symbol = ?',
+                        (provider, interval, symbol)
+                    )
+                    self._release(provider, interval, *region)
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def _release(self, provider: str, interval: str, offset: int, capacity: int) -> None:
+        """Put a region no longer referenced by the index on the free list, merged with free neighbours."""
+        if not capacity:
+            return
+        neighbours = self._conn.execute(
+            '''SELECT offset, capacity FROM free_regions
+               WHERE provider = ? AND interval = ? AND (offset + capacity = ? OR offset = ?)''',
+            (provider, interval, offset, offset + capacity)
+        ).fetchall()
+        for neighbour_offset, neighbour_capacity in neighbours:
+            self._conn.execute(
+                'DELETE FROM free_regions WHERE provider = ? AND interval = ? AND offset = ?',
+                (provider, interval, neighbour_offset)
+            )
+            offset = min(offset, neighbour_offset)
+            capacity += neighbour_capacity
+        # The merged region counts as freed now, so no part of it is reused too early
+        self._conn.execute(
+            'INSERT INTO free_regions VALUES (?, ?, ?, ?, ?)',
+            (provider, interval, offset, capacity, time.time())
+        )
+
+    def _allocate(self, provider: str, interval: str, capacity: int) -> Tuple[int, int]:
+        """Reserve a region, reusing the smallest free one that fits or growing the files."""
+        free = self._conn.execute(
+            '''SELECT offset, capacity, freed_at FROM free_regions
+               WHERE provider = ? AND interval = ? AND capacity >= ? AND freed_at <= ?
+               ORDER BY capacity LIMIT 1''',
+            (provider, interval, capacity, time.time() - self.reuse_after_seconds)
+        ).fetchone()
+        if free is not None:
+            offset, free_capacity, freed_at = free
+            self._conn.execute(
+                'DELETE FROM free_regions WHERE provider = ? AND interval = ? AND offset = ?',
+                (provider, interval, offset)
+            )
+            if free_capacity - capacity >= self.initial_capacity:
+                # Split off the rest; it was freed just as long ago
+                self._conn.execute(
+                    'INSERT INTO free_regions VALUES (?, ?, ?, ?, ?)',
+                    (provider, interval, offset + capacity, free_capacity - capacity, freed_at)
+                )
+            else:
+                capacity = free_capacity
+            return offset, capacity
+
+        row = self._conn.execute(
+            'SELECT rows FROM partitions WHERE provider = ? AND interval = ?', (provider, interval)
+        ).fetchone()
+        offset = row[0] if row is not None else 0
+        self._conn.execute(
+            'INSERT OR REPLACE INTO partitions VALUES (?, ?, ?)', (provider, interval, offset + capacity)
+        )
+        for name, dtype in COLUMN_TYPES.items():
+            path = self._file(provider, interval, name)
+            needed = (offset + capacity) * np.dtype(dtype).itemsize
+            if os.path.getsize(path) < needed:
+                # Grow geometrically so files are not resized on every new symbol
+                with open(path, 'r+b') as handle:
+                    handle.truncate(max(needed, 2 * os.path.getsize(path)))
+        return offset, capacity
+
+    def _column(self, provider: str, interval: str, name: str, rows: int) -> np.memmap:
+        """Map a column file, remapping when another writer has grown it."""
+        key = (provider, interval, name)
+        mapped = self._maps.get(key)
+        if mapped is None or len(mapped) < rows:
+            path = self._file(provider, interval, name)
+            size = os.path.getsize(path) // np.dtype(COLUMN_TYPES[name]).itemsize
+            if size == 0:
+                return np.empty(0, dtype=COLUMN_TYPES[name])
+            # Mappings already handed out stay valid; they keep the old map alive
+            mapped = np.memmap(path, dtype=COLUMN_TYPES[name], mode='r+', shape=(size,))
+            self._maps[key] = mapped
+        return mapped
+
+    def _file(self, provider: str, interval: str, name: str) -> str:
+        directory = os.path.join(self.path, provider, interval)
+        path = os.path.join(directory, f'{name}.bin')
+        if not os.path.exists(path):
+            os.makedirs(directory, exist_ok=True)
+            open(path, 'ab').close()
+        return path
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the number of stored series and bars and the allocated and free file rows."""
+        with self._lock:
+            series, bars = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(length), 0) FROM regions'
+            ).fetchone()
+            allocated = self._conn.execute('SELECT COALESCE(SUM(rows), 0) FROM partitions').fetchone()[0]
+            free = self._conn.execute('SELECT COALESCE(SUM(capacity), 0) FROM free_regions').fetchone()[0]
+        return {'series': series, 'bars': bars, 'allocated_rows': allocated, 'free_rows': free}
+
+    def close(self) -> None:
+        """Close the index database and drop the file mappings."""
+        with self._lock:
+            self._conn.close()
+            self._maps.clear()
+
+def _typed_columns(bars: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Convert bar columns to the stored types, sorted and de-duplicated by timestamp."""
+    timestamps = np.asarray(bars['timestamp'], dtype=np.int64)
+    # Keep the last bar for a repeated timestamp, like INSERT OR REPLACE would
+    order = np.argsort(timestamps, kind='stable')[::-1]
+    _, unique = np.unique(timestamps[order], return_index=True)
+    keep = order[unique]
+    columns = {'timestamp': timestamps[keep]}
+    for name, dtype in COLUMN_TYPES.items():
+        if name == 'timestamp':
+            continue
+        column = np.asarray(bars[name], dtype=np.float64)[keep]
+        if name == 'volume':
+            column = np.nan_to_num(column)
+        columns[name] = column.astype(dtype)
+    return columns
+
+def _same_bar(stored: Dict[str, np.ndarray], new: Dict[str, np.ndarray]) -> bool:
+    """Whether a stored one-bar series equals the first bar of new, NaN included."""
+    return all(np.array_equal(stored[name], new[name][:1], equal_nan=True) for name in COLUMN_TYPES)
+
+def _concat(first: Dict[str, np.ndarray], second: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    return {name: np.concatenate([first[name], second[name]]) for name in COLUMN_TYPES}
+
+def _merge(stored: Dict[str, np.ndarray], new: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Merge two sorted series, preferring new bars on equal timestamps."""
+    keep = ~np.isin(stored['timestamp'], new['timestamp'])
+    combined = _concat({name: values[keep] for name, values in stored.items()}, new)
+    order = np.argsort(combined['timestamp'], kind='stable')
+    return {name: values[order] for name, values in combined.items()}
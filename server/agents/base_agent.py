@@ -1,12 +1,33 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional
 from langchain.schema import BaseMessage
 from langchain_core.runnables import RunnableConfig
 from langchain.agents import AgentExecutor
 from langchain_core.messages import HumanMessage
 
+# State recorded by agents during one run, e.g. per-symbol errors. Tasks copy
+# the context they are started from, so every task of a run shares its dict
+# while concurrent runs each see their own.
+_run_state: ContextVar[Optional[Dict[str, Any]]] = ContextVar('agent_run_state', default=None)
+
+def start_run_state() -> Dict[str, Any]:
+    """Give the current task, and the tasks it starts from now on, a fresh agent state.
+    
+    Returns:
+        Dict[str, Any]: The new, empty state
+    """
+    state: Dict[str, Any] = {}
+    _run_state.set(state)
+    return state
+
 class BaseAgent(ABC):
-    """Base class for all agents in the stock market analysis system."""
+    """Base class for all agents in the stock market analysis system.
+    
+    Agents are shared by all requests, so they keep no per-request data on the
+    instance: per-request settings arrive with the inputs and anything recorded
+    during a run goes to the run's state (see start_run_state).
+    """
     
     def __init__(self, config: Dict[str, Any]):
         """Initialize the base agent with configuration.
@@ -15,7 +36,14 @@ class BaseAgent(ABC):
             config (Dict[str, Any]): Agent-specific configuration
         """
         self.config = config
-        self.state: Dict[str, Any] = {}
+    
+    @property
+    def state(self) -> Dict[str, Any]:
+        """The agent state of the current run."""
+        state = _run_state.get()
+        if state is None:
+            state = start_run_state()
+        return state
         
     @abstractmethod
     async def run(self, inputs: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
@@ -31,7 +59,7 @@ class BaseAgent(ABC):
         pass
     
     def update_state(self, key: str, value: Any) -> None:
-        """Update the agent's state.
+        """Update the agent state of the current run.
         
         Args:
             key (str): State key to update
@@ -40,7 +68,7 @@ class BaseAgent(ABC):
         self.state[key] = value
     
     def get_state(self, key: str) -> Any:
-        """Get a value from the agent's state.
+        """Get a value from the agent state of the current run.
         
         Args:
             key (str): State key to retrieve
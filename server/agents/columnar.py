@@ -0,0 +1,100 @@
+import math
+from typing import Dict, Any, List, Tuple
+import numpy as np
+import pandas as pd
+
+# Processed bar data travels between stages as one typed array per column,
+# keyed by symbol: {symbol: {'timestamp': int64[n], 'close': float64[n], ...}}.
+# Bars read from the memory-mapped bar store keep its float32 prices, so that
+# they stay views of the store (see bar_store.COLUMN_TYPES); consumers widen
+# them to float64 in the arrays they build, not with an extra copy.
+TIMESTAMP_COLUMN = 'timestamp'
+
+# Columns of a bar row, in row order
+BAR_COLUMNS = (TIMESTAMP_COLUMN, 'open', 'high', 'low', 'close', 'volume')
+
+def frame_to_columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Split a DataFrame into typed column arrays.
+
+    Timestamps become int64 epoch milliseconds and every other numeric column
+    float64. Columns that already have that dtype are returned as views of the
+    frame's memory rather than copies.
+
+    Args:
+        df (pd.DataFrame): Bar data with one row per bar
+
+    Returns:
+        Dict[str, np.ndarray]: Column arrays of equal length
+    """
+    columns = {}
+    for name in df.columns:
+        series = df[name]
+        if name == TIMESTAMP_COLUMN:
+            columns[name] = series.to_numpy(dtype=np.int64, copy=False)
+        elif pd.api.types.is_numeric_dtype(series):
+            columns[name] = series.to_numpy(dtype=np.float64, copy=False)
+    return columns
+
+def records_to_columns(records: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Convert bar records into typed column arrays; missing values become NaN.
+
+    Args:
+        records (List[Dict[str, Any]]): Bar records in time order
+
+    Returns:
+        Dict[str, np.ndarray]: Column arrays of equal length
+    """
+    return frame_to_columns(pd.DataFrame.from_records(records))
+
+def rows_to_columns(rows: List[Tuple]) -> Dict[str, np.ndarray]:
+    """Convert (ts, open, high, low, close, volume) rows into typed column arrays.
+
+    Args:
+        rows (List[Tuple]): Bar rows in time order
+
+    Returns:
+        Dict[str, np.ndarray]: Column arrays of equal length; missing values become NaN
+    """
+    values = np.array(rows, dtype=np.float64).reshape(len(rows), len(BAR_COLUMNS))
+    columns = {TIMESTAMP_COLUMN: values[:, 0].astype(np.int64)}
+    for index, name in enumerate(BAR_COLUMNS[1:], start=1):
+        columns[name] = values[:, index]
+    return columns
+
+def columns_to_records(columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """Convert column arrays back into JSON-ready bar records.
+
+    Args:
+        columns (Dict[str, np.ndarray]): Column arrays of equal length
+
+    Returns:
+        List[Dict[str, Any]]: Bar records with plain Python values and None for NaN
+    """
+    names = list(columns)
+    values = [to_jsonable(columns[name]) for name in names]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+def to_jsonable(value: Any) -> Any:
+    """Recursively turn NumPy arrays and scalars into plain, JSON-safe Python values.
+
+    Meant for the HTTP boundary; NaN and infinities become None.
+
+    Args:
+        value (Any): Value possibly containing NumPy data
+
+    Returns:
+        Any: Equivalent value made of dicts, lists, strings, numbers and None
+    """
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'f':
+            return [None if not math.isfinite(item) else item for item in value.tolist()]
+        return value.tolist()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
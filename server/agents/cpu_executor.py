@@ -0,0 +1,149 @@
+import asyncio
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import numpy as np
+
+# Offsets of arrays packed into a shared memory block are aligned to this many bytes
+SHARED_ALIGNMENT = 64
+
+class CPUExecutor:
+    """Runs CPU-bound agent work off the event loop, split into batches of symbols.
+
+    Backends:
+        'thread': a thread pool. NumPy releases the GIL inside its kernels, so
+            vectorized work runs in parallel and the event loop stays free.
+        'process': a process pool. Each batch's column arrays are copied once
+            into a shared memory block that the worker maps, instead of being
+            pickled through the pool's pipe.
+        'inline': run on the calling thread, for debugging and profiling.
+
+    Functions given to map_batches() must be module-level so a process pool
+    can import them.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """Initialize the executor; the pool itself starts on first use.
+
+        Args:
+            config (Optional[Dict[str, Any]]): An agent's 'executor' configuration
+        """
+        config = config or {}
+        self.backend = config.get('backend', 'thread')
+        self.max_workers = config.get('max_workers') or os.cpu_count() or 1
+        if self.backend not in ('thread', 'process', 'inline'):
+            raise ValueError(f'Unknown executor backend: {self.backend}')
+        self._pool: Optional[Executor] = None
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.backend == 'process':
+                # Forking a process that runs an event loop and threads is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='cpu-executor')
+        return self._pool
+
+    async def map_batches(self, fn: Callable[..., Any], items: Dict[str, Dict[str, np.ndarray]],
+                          batch_size: int, *args: Any) -> List[Any]:
+        """Call fn(batch, *args) on consecutive batches of items concurrently.
+
+        Args:
+            fn (Callable[..., Any]): Module-level function taking a batch dictionary first
+            items (Dict[str, Dict[str, np.ndarray]]): Column arrays keyed by symbol
+            batch_size (int): Maximum number of symbols per batch
+            *args (Any): Further picklable arguments passed to every call
+
+        Returns:
+            List[Any]: fn's result for every batch, in batch order
+        """
+        keys = list(items)
+        size = max(1, batch_size or len(keys))
+        batches = [{key: items[key] for key in keys[start:start + size]} for start in range(0, len(keys), size)]
+        return list(await asyncio.gather(*(self.run(fn, batch, *args) for batch in batches)))
+
+    async def run(self, fn: Callable[..., Any], batch: Dict[str, Dict[str, np.ndarray]], *args: Any) -> Any:
+        """Call fn(batch, *args) for a single batch on the executor.
+
+        Args:
+            fn (Callable[..., Any]): Module-level function taking the batch dictionary first
+            batch (Dict[str, Dict[str, np.ndarray]]): Column arrays keyed by symbol
+            *args (Any): Further picklable arguments
+
+        Returns:
+            Any: fn's result
+        """
+        if self.backend == 'inline':
+            return fn(batch, *args)
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        if self.backend == 'thread':
+            return await loop.run_in_executor(pool, fn, batch, *args)
+
+        # Copying into shared memory is bulk work too; keep it off the event loop
+        block, layout = await asyncio.to_thread(_share, batch)
+        try:
+            result = await loop.run_in_executor(pool, _run_shared, fn, block.name, layout, args)
+        finally:
+            block.close()
+            block.unlink()
+        return await asyncio.to_thread(pickle.loads, result)
+
+    def shutdown(self) -> None:
+        """Stop the worker pool, waiting for running batches to finish."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+def _share(batch: Dict[str, Any]) -> Tuple[shared_memory.SharedMemory, Dict[str, Any]]:
+    """Copy a batch's arrays into one shared memory block and describe where each lives.
+
+    Values other than column dictionaries are passed along in the layout itself.
+    """
+    layout: Dict[str, Any] = {}
+    offset = 0
+    for key, columns in batch.items():
+        if not isinstance(columns, dict):
+            layout[key] = ('value', columns)
+            continue
+        placed = {}
+        for name, values in columns.items():
+            values = np.asarray(values)
+            placed[name] = (offset, values.dtype.str, values.shape)
+            offset += -(-values.nbytes // SHARED_ALIGNMENT) * SHARED_ALIGNMENT
+        layout[key] = ('columns', placed)
+
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for key, (kind, placed) in layout.items():
+        if kind != 'columns':
+            continue
+        for name, (start, dtype, shape) in placed.items():
+            np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=start)[...] = batch[key][name]
+    return block, layout
+
+def _run_shared(fn: Callable[..., Any], name: str, layout: Dict[str, Any], args: Tuple) -> bytes:
+    """Worker side of the process backend: map the batch, run fn and pickle its result.
+
+    The result is pickled before the block is unmapped, since it may hold views of it.
+    """
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        batch = {}
+        for key, (kind, value) in layout.items():
+            if kind != 'columns':
+                batch[key] = value
+                continue
+            batch[key] = {
+                column: np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=start)
+                for column, (start, dtype, shape) in value.items()
+            }
+        result = pickle.dumps(fn(batch, *args), protocol=pickle.HIGHEST_PROTOCOL)
+        del batch
+        return result
+    finally:
+        block.close()
@@ -1,12 +1,60 @@
-from typing import Dict, Any, List
+import asyncio
+from typing import Dict, Any, List, Optional, Tuple
 from langchain.schema import BaseMessage
 from langchain_core.runnables import RunnableConfig
-import requests
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from config import ALPHA_VANTAGE_API_KEY, POLYGON_API_KEY, FINHUB_API_KEY
 from config import ALPHA_VANTAGE_BASE_URL, POLYGON_BASE_URL, FINHUB_BASE_URL
 from .base_agent import BaseAgent
+from .fetch_client import FetchClient
+from .rate_limiter import ProviderScheduler
+from .price_cache import PriceCache
+from .normalizers import decode_alpha_vantage, decode_polygon
+from .normalizers import alpha_vantage_columns, polygon_columns, finnhub_quote_columns
+from .preferences import risk_level
+from .screening_index import ScreeningIndex
+from .market_snapshot import MarketSnapshotService
+
+# Calendar days of bars passed downstream and their granularity, per analysis timeframe
+TIMEFRAME_WINDOWS = {
+    '1d': {'days': 1, 'interval': '5minute'},
+    '1wk': {'days': 7, 'interval': 'hour'},
+    '1mo': {'days': 31, 'interval': 'day'},
+    '3mo': {'days': 92, 'interval': 'day'},
+    '6mo': {'days': 183, 'interval': 'day'},
+    '1y': {'days': 365, 'interval': 'day'},
+    '5y': {'days': 1827, 'interval': 'day'},
+}
+
+# How each interval is requested from each provider, how long a stored series stays
+# fresh, and how much time Alpha Vantage's 100-bar compact output safely spans
+INTERVALS = {
+    '5minute': {'polygon': (5, 'minute'), 'alpha_vantage': '5min', 'kind': 'intraday',
+                'compact_span': timedelta(hours=8)},
+    'hour': {'polygon': (1, 'hour'), 'alpha_vantage': '60min', 'kind': 'intraday',
+             'compact_span': timedelta(days=4)},
+    'day': {'polygon': (1, 'day'), 'alpha_vantage': None, 'kind': 'daily',
+            'compact_span': timedelta(days=130)},
+}
+
+# Extra calendar days fetched so weekends and holidays never leave a window empty
+WINDOW_SLACK_DAYS = 4
+
+def _to_epoch_ms(moment: datetime) -> int:
+    return int(moment.timestamp() * 1000)
+
+def _from_epoch_ms(ts: int) -> datetime:
+    return datetime.fromtimestamp(ts / 1000, timezone.utc)
+
+def _get_window(timeframe: str) -> Dict[str, Any]:
+    return TIMEFRAME_WINDOWS.get(timeframe, TIMEFRAME_WINDOWS['1d'])
+
+def _window_start(timeframe: str) -> datetime:
+    """Midnight UTC of the first day that has to be fetched for a timeframe."""
+    start = datetime.now(timezone.utc) - timedelta(days=_get_window(timeframe)['days'] + WINDOW_SLACK_DAYS)
+    return datetime(start.year, start.month, start.day, tzinfo=timezone.utc)
 
 class DataFetchingAgent(BaseAgent):
     """Agent responsible for fetching stock market data from multiple APIs."""
@@ -16,6 +64,16 @@ class DataFetchingAgent(BaseAgent):
         self.apis = self.config['apis']
         self.timeout = self.config['request_timeout']
         self.retry_attempts = self.config['retry_attempts']
+        self.max_discovered_symbols = self.config.get('max_discovered_symbols', 20)
+        self.scheduler = ProviderScheduler(self.config.get('rate_limits', {}))
+        self.fetch_client = FetchClient(self.config, scheduler=self.scheduler)
+        cache_config = self.config.get('cache', {})
+        self.cache = PriceCache(cache_config) if cache_config.get('enabled') else None
+        screening_config = self.config.get('screening', {})
+        self.screening = ScreeningIndex(screening_config) if screening_config.get('enabled') else None
+        self.market_snapshot = MarketSnapshotService(
+            self.config.get('market_snapshot', {}), self._fetch_market_overview, self.screening
+        )
     
     async def run(self, inputs: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
         """Fetch and analyze market data to discover potential stocks.
@@ -25,83 +83,235 @@ class DataFetchingAgent(BaseAgent):
             config (RunnableConfig): Configuration for the execution
             
         Returns:
-            Dict[str, Any]: Collected and analyzed market data
+            Dict[str, Any]: Collected market data keyed by symbol, then by provider
         """
         results = {}
-        preferences = inputs.get('preferences', {})
         timeframe = inputs.get('timeframe', '1d')
-        ai_config = inputs.get('ai_config', {})
         
         try:
-            # Get market overview and sector performance
-            market_data = self._fetch_market_overview()
-            
-            # Use preferences to filter sectors and get top performing stocks
-            preferred_sectors = preferences.get('preferred_sectors', [])
-            risk_tolerance = preferences.get('risk_tolerance', 'moderate')
+            symbols = await self.discover_symbols(inputs)
             
-            # Get potential stocks based on market analysis and preferences
-            potential_stocks = self._discover_potential_stocks(market_data, preferred_sectors, risk_tolerance)
-            
-            # Fetch detailed data for potential stocks
-            for symbol in potential_stocks[:20]:  # Limit to top 20 for detailed analysis
-                try:
-                    stock_data = {}
-                    if 'alpha_vantage' in self.apis:
-                        stock_data.update(self._fetch_alpha_vantage([symbol], timeframe))
-                    if 'polygon' in self.apis:
-                        stock_data.update(self._fetch_polygon([symbol], timeframe))
-                    if 'finhub' in self.apis:
-                        stock_data.update(self._fetch_finhub([symbol], timeframe))
-                    
-                    results[symbol] = stock_data
-                except Exception as e:
-                    self.update_state(f'error_fetching_{symbol}', str(e))
-                    continue
+            # Fetch detailed data for all symbols from all providers concurrently
+            fetched = await asyncio.gather(*(self.fetch_symbol(symbol, timeframe) for symbol in symbols))
+            results = dict(zip(symbols, fetched))
             
         except Exception as e:
             self.update_state('error_market_analysis', str(e))
         
         return results
     
-    def _fetch_alpha_vantage(self, symbols: List[str], timeframe: str) -> Dict[str, Any]:
-        """Fetch data from Alpha Vantage API."""
-        data = {}
-        for symbol in symbols:
-            params = {
-                'function': 'TIME_SERIES_DAILY',
-                'symbol': symbol,
-                'apikey': ALPHA_VANTAGE_API_KEY,
-                'outputsize': 'full'
-            }
-            response = requests.get(ALPHA_VANTAGE_BASE_URL, params=params, timeout=self.timeout)
-            data[symbol] = response.json()
-        return data
+    async def discover_symbols(self, inputs: Dict[str, Any]) -> List[str]:
+        """Pick the symbols worth a detailed look from the market overview.
+        
+        Candidates come from the shared market snapshot, so discovery makes no
+        provider call of its own. They are screened against the sector,
+        market-cap and dividend preferences with the local screening index, so
+        only symbols that can qualify are fetched and analyzed.
+        
+        Args:
+            inputs (Dict[str, Any]): Contains preferences
+            
+        Returns:
+            List[str]: Up to max_discovered_symbols candidate symbols, most promising first
+        """
+        preferences = inputs.get('preferences', {})
+        
+        # Get the ordered candidates of the current market snapshot
+        snapshot = await self.market_snapshot.get()
+        ordering = 'aggressive' if risk_level(preferences) == 'aggressive' else 'default'
+        potential_stocks = snapshot['candidates'][ordering]
+        if self.screening is not None:
+            return self.screening.screen(potential_stocks, preferences, self.max_discovered_symbols)
+        return potential_stocks[:self.max_discovered_symbols]
+    
+    async def fetch_symbol(self, symbol: str, timeframe: str) -> Dict[str, Any]:
+        """Fetch one symbol's data from all providers concurrently.
+        
+        Provider failures are recorded in the agent state and leave that provider out.
+        
+        Args:
+            symbol (str): Ticker symbol
+            timeframe (str): Analysis timeframe
+            
+        Returns:
+            Dict[str, Any]: The symbol's data keyed by provider
+        """
+        fetchers = {
+            'alpha_vantage': self._fetch_alpha_vantage,
+            'polygon': self._fetch_polygon,
+            'finhub': self._fetch_finhub
+        }
+        apis = [api for api in self.apis if api in fetchers]
+        provider_data = await asyncio.gather(*(fetchers[api]([symbol], timeframe) for api in apis))
+        return {api: data[symbol] for api, data in zip(apis, provider_data) if symbol in data}
+    
+    async def _fetch_market_overview(self) -> Dict[str, Any]:
+        """Fetch top gainers, losers and most actively traded tickers."""
+        params = {
+            'function': 'TOP_GAINERS_LOSERS',
+            'apikey': ALPHA_VANTAGE_API_KEY
+        }
+        return await self._cached_get_json(
+            'alpha_vantage', '*', 'overview', 'overview', ALPHA_VANTAGE_BASE_URL, params=params
+        )
     
-    def _fetch_polygon(self, symbols: List[str], timeframe: str) -> Dict[str, Any]:
-        """Fetch data from Polygon API."""
+    async def _cached_get_json(self, provider: str, symbol: str, timeframe: str, kind: str, url: str,
+                               params: Dict[str, Any] = None, headers: Dict[str, str] = None) -> Any:
+        """Serve a provider request from the local cache, fetching and storing it on a miss."""
+        if self.cache is not None:
+            payload = await asyncio.to_thread(self.cache.get, provider, symbol, timeframe)
+            if payload is not None:
+                return payload
+        
+        payload = await self.fetch_client.get_json(provider, url, params=params, headers=headers)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set, provider, symbol, timeframe, kind, payload)
+        return payload
+    
+    async def _gather_symbols(self, fetch_one, symbols: List[str], api: str) -> Dict[str, Any]:
+        """Run a per-symbol provider fetch for every symbol concurrently."""
+        responses = await asyncio.gather(*(fetch_one(symbol) for symbol in symbols), return_exceptions=True)
         data = {}
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=30)  # Default to 30 days
-        
-        for symbol in symbols:
-            endpoint = f'{POLYGON_BASE_URL}/aggs/ticker/{symbol}/range/1/day/{start_date.strftime("%Y-%m-%d")}/{end_date.strftime("%Y-%m-%d")}'
-            headers = {'Authorization': f'Bearer {POLYGON_API_KEY}'}
-            response = requests.get(endpoint, headers=headers, timeout=self.timeout)
-            data[symbol] = response.json()
+        for symbol, response in zip(symbols, responses):
+            if isinstance(response, Exception):
+                self.update_state(f'error_fetching_{api}_{symbol}', str(response))
+                continue
+            data[symbol] = response
         return data
     
-    def _fetch_finhub(self, symbols: List[str], timeframe: str) -> Dict[str, Any]:
-        """Fetch data from Finhub API."""
-        data = {}
-        for symbol in symbols:
+    async def _fetch_bars(self, provider: str, symbol: str, timeframe: str, fetch_since) -> Dict[str, np.ndarray]:
+        """Serve a timeframe's bars from the local store, fetching only bars it is missing.
+        
+        Args:
+            provider (str): Provider name
+            symbol (str): Ticker symbol
+            timeframe (str): Analysis timeframe selecting the window and interval
+            fetch_since: Coroutine function taking the last stored bar time (None to
+                load the whole window) and returning the provider's bar columns,
+                plus the time from which they are complete when a whole window was loaded
+            
+        Returns:
+            Dict[str, np.ndarray]: Column arrays of the bars covering the timeframe window, in time order
+        """
+        window = _get_window(timeframe)
+        interval = window['interval']
+        window_ms = window['days'] * 86400000
+        fetch_start_ts = _to_epoch_ms(_window_start(timeframe))
+        
+        if self.cache is None:
+            columns, _ = await fetch_since(None)
+            first = int(np.searchsorted(columns['timestamp'], fetch_start_ts))
+            columns = {name: values[first:] for name, values in columns.items()}
+        else:
+            covered_from, last_ts, fresh = await asyncio.to_thread(
+                self.cache.get_series_state, provider, symbol, interval
+            )
+            # A series stored for a shorter window has to be backfilled first
+            if covered_from is None or covered_from > fetch_start_ts:
+                last_ts, fresh = None, False
+            if not fresh:
+                bars, covered = await fetch_since(last_ts)
+                await asyncio.to_thread(
+                    self.cache.append_bars, provider, symbol, interval, bars, INTERVALS[interval]['kind'], covered
+                )
+            columns = await asyncio.to_thread(self.cache.load_bars, provider, symbol, interval, fetch_start_ts)
+        
+        # The window ends at the latest bar, so a weekend does not empty a one-day window
+        timestamps = columns['timestamp']
+        if len(timestamps):
+            first = int(np.searchsorted(timestamps, timestamps[-1] - window_ms))
+            columns = {name: values[first:] for name, values in columns.items()}
+        return columns
+    
+    async def _fetch_alpha_vantage(self, symbols: List[str], timeframe: str) -> Dict[str, Any]:
+        """Fetch daily or intraday bars from Alpha Vantage API."""
+        window = _get_window(timeframe)
+        interval = INTERVALS[window['interval']]
+        av_interval = interval['alpha_vantage']
+        
+        async def fetch_one(symbol: str) -> Any:
+            async def fetch_since(last_ts: Optional[int]) -> Tuple[Dict[str, np.ndarray], Optional[int]]:
+                # The compact output holds the latest 100 bars: enough for short daily
+                # windows and for extending a recent series
+                if last_ts is None:
+                    compact = av_interval is None and timedelta(days=window['days'] + WINDOW_SLACK_DAYS) <= interval['compact_span']
+                else:
+                    compact = datetime.now(timezone.utc) - _from_epoch_ms(last_ts) < interval['compact_span']
+                params = {
+                    'function': 'TIME_SERIES_INTRADAY' if av_interval else 'TIME_SERIES_DAILY',
+                    'symbol': symbol,
+                    'apikey': ALPHA_VANTAGE_API_KEY,
+                    'outputsize': 'compact' if compact else 'full'
+                }
+                if av_interval:
+                    params['interval'] = av_interval
+                payload = await self.fetch_client.get_json(
+                    'alpha_vantage', ALPHA_VANTAGE_BASE_URL, params=params, decode=decode_alpha_vantage
+                )
+                bars = alpha_vantage_columns(payload)
+                if last_ts is not None:
+                    return bars, None
+                # Full output is everything the provider has for this interval
+                if not compact:
+                    return bars, 0
+                return bars, int(bars['timestamp'][0]) if len(bars['timestamp']) else None
+            
+            return await self._fetch_bars('alpha_vantage', symbol, timeframe, fetch_since)
+        
+        return await self._gather_symbols(fetch_one, symbols, 'alpha_vantage')
+    
+    async def _fetch_polygon(self, symbols: List[str], timeframe: str) -> Dict[str, Any]:
+        """Fetch bars at the timeframe's granularity from Polygon API."""
+        multiplier, timespan = INTERVALS[_get_window(timeframe)['interval']]['polygon']
+        end_date = datetime.now(timezone.utc)
+        start_date = _window_start(timeframe)
+        headers = {'Authorization': f'Bearer {POLYGON_API_KEY}'}
+        params = {'sort': 'asc', 'limit': 50000}
+        
+        async def fetch_one(symbol: str) -> Any:
+            async def fetch_since(last_ts: Optional[int]) -> Tuple[Dict[str, np.ndarray], Optional[int]]:
+                # Only request the range after the last stored bar
+                range_start = max(start_date, _from_epoch_ms(last_ts)) if last_ts is not None else start_date
+                endpoint = f'{POLYGON_BASE_URL}/aggs/ticker/{symbol}/range/{multiplier}/{timespan}/{range_start.strftime("%Y-%m-%d")}/{end_date.strftime("%Y-%m-%d")}'
+                payload = await self.fetch_client.get_json(
+                    'polygon', endpoint, params=params, headers=headers, decode=decode_polygon
+                )
+                return polygon_columns(payload), None if last_ts is not None else _to_epoch_ms(start_date)
+            
+            return await self._fetch_bars('polygon', symbol, timeframe, fetch_since)
+        
+        return await self._gather_symbols(fetch_one, symbols, 'polygon')
+    
+    async def _fetch_finhub(self, symbols: List[str], timeframe: str) -> Dict[str, Any]:
+        """Fetch the latest quote from Finhub API as a single bar."""
+        async def fetch_one(symbol: str) -> Any:
             params = {
                 'symbol': symbol,
                 'token': FINHUB_API_KEY
             }
-            response = requests.get(f'{FINHUB_BASE_URL}/quote', params=params, timeout=self.timeout)
-            data[symbol] = response.json()
-        return data
+            # Quotes are tiny, so the cached JSON form is kept and converted on the way out
+            quote = await self._cached_get_json(
+                'finhub', symbol, 'quote', 'quote', f'{FINHUB_BASE_URL}/quote', params=params
+            )
+            return finnhub_quote_columns(quote)
+        
+        return await self._gather_symbols(fetch_one, symbols, 'finhub')
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get rate limiter, request and cache metrics for every provider, and the screening and snapshot state."""
+        return {
+            'rate_limits': self.scheduler.get_metrics(),
+            'requests': self.fetch_client.get_metrics(),
+            'cache': self.cache.get_metrics() if self.cache is not None else None,
+            'screening': self.screening.get_metrics() if self.screening is not None else None,
+            'market_snapshot': self.market_snapshot.get_metrics()
+        }
+    
+    async def aclose(self) -> None:
+        """Release the shared HTTP connection pool and the cache connection."""
+        await self.fetch_client.aclose()
+        if self.cache is not None:
+            self.cache.close()
     
     def process_message(self, message: BaseMessage) -> Dict[str, Any]:
         """Process messages from other agents requesting data.
@@ -1,9 +1,13 @@
-from typing import Dict, Any, List
+import asyncio
+from typing import Dict, Any, List, Optional, Tuple
 from langchain.schema import BaseMessage
 from langchain_core.runnables import RunnableConfig
-import pandas as pd
 import numpy as np
 from .base_agent import BaseAgent
+from .columnar import records_to_columns
+from .cpu_executor import CPUExecutor
+from .micro_batcher import MicroBatcher
+from .preferences import risk_level
 
 class DataProcessingAgent(BaseAgent):
     """Agent responsible for cleaning and normalizing stock market data."""
@@ -12,81 +16,100 @@ class DataProcessingAgent(BaseAgent):
         super().__init__(config)
         self.batch_size = self.config['batch_size']
         self.normalization = self.config['normalization']
-        self.cleaning_rules = self.config['cleaning_rules']
+        self.cleaning_rules = tuple(self.config['cleaning_rules'])
+        self.executor = CPUExecutor(self.config.get('executor'))
+        self.batcher = MicroBatcher(
+            self._process_gathered, self.batch_size, self.config.get('batch_linger_seconds', 0.01)
+        )
     
     async def run(self, inputs: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
         """Process and clean the stock market data.
         
+        Symbols processed concurrently with the same cleaning rules, e.g. by the
+        per-symbol paths of one or several workflow runs, are cleaned and
+        normalized together on the executor, in batches of up to batch_size.
+        
         Args:
             inputs (Dict[str, Any]): Raw data from multiple APIs and user preferences
             config (RunnableConfig): Configuration for the execution
             
         Returns:
-            Dict[str, Any]: Processed and cleaned data
+            Dict[str, Any]: Processed and cleaned data as typed column arrays keyed by symbol
         """
-        processed_data = {}
         preferences = inputs.get('preferences', {})
         
-        # Adjust cleaning rules based on user risk tolerance
-        if preferences.get('risk_tolerance'):
-            risk_level = preferences['risk_tolerance']
-            if risk_level == 'conservative':
-                self.cleaning_rules['handle_outliers'] = True
-                self.cleaning_rules['remove_nulls'] = True
-            elif risk_level == 'aggressive':
-                self.cleaning_rules['handle_outliers'] = False
+        cleaning_rules = tuple(self._cleaning_rules_for(preferences))
         
-        for api, data in inputs.items():
-            if api == 'preferences':
-                continue
-                
-            try:
-                df = self._convert_to_dataframe(data)
-                df = self._apply_cleaning_rules(df)
-                
-                if self.normalization:
-                    df = self._normalize_data(df)
-                
-                # Apply sector filtering if specified in preferences
-                if preferences.get('preferred_sectors'):
-                    df = self._filter_by_sectors(df, preferences['preferred_sectors'])
-                
-                processed_data[api] = df.to_dict(orient='records')
-            except Exception as e:
-                self.update_state(f'error_processing_{api}', str(e))
+        symbols = [symbol for symbol in inputs if symbol != 'preferences']
+        batch = self._convert_batch(inputs, symbols)
+        results = await asyncio.gather(*(
+            self.batcher.submit(cleaning_rules, symbol, columns) for symbol, columns in batch.items()
+        ))
         
+        processed_data = {}
+        for symbol, (columns, error) in zip(batch, results):
+            # Errors are recorded here, in the calling run's state
+            if error is not None:
+                self.update_state(f'error_processing_{symbol}', error)
+            else:
+                processed_data[symbol] = columns
         return processed_data
     
-    def _convert_to_dataframe(self, data: Dict[str, Any]) -> pd.DataFrame:
-        """Convert API response data to pandas DataFrame."""
-        # Handle different API response formats
-        if isinstance(data, dict):
-            return pd.DataFrame.from_dict(data, orient='index')
+    async def _process_gathered(self, cleaning_rules: Tuple[str, ...], batch: Dict[str, Dict[str, np.ndarray]]
+                                ) -> Dict[str, Tuple[Optional[Dict[str, np.ndarray]], Optional[str]]]:
+        """Clean and normalize a gathered batch on the executor.
+        
+        Sector and other preference filters are applied before fetching, by the
+        fetching agent's screening index.
+        
+        Returns:
+            Dict[str, Tuple[Optional[Dict[str, np.ndarray]], Optional[str]]]: Processed
+                columns or an error message, keyed by symbol
+        """
+        processed, errors = await self.executor.run(_process_batch, batch, list(cleaning_rules), self.normalization)
+        return {symbol: (processed.get(symbol), errors.get(symbol)) for symbol in batch}
+    
+    def _cleaning_rules_for(self, preferences: Dict[str, Any]) -> List[str]:
+        """Adjust the configured cleaning rules to the user's risk tolerance."""
+        cleaning_rules = list(self.cleaning_rules)
+        level = risk_level(preferences)
+        if level == 'conservative':
+            cleaning_rules += [rule for rule in ('remove_nulls', 'handle_outliers') if rule not in cleaning_rules]
+        elif level == 'aggressive':
+            cleaning_rules = [rule for rule in cleaning_rules if rule != 'handle_outliers']
+        return cleaning_rules
+    
+    def _convert_batch(self, inputs: Dict[str, Any], symbols: List[str]) -> Dict[str, Dict[str, np.ndarray]]:
+        """Convert a batch of symbols' provider payloads into column arrays."""
+        batch = {}
+        for symbol in symbols:
+            try:
+                batch[symbol] = self._convert_to_columns(self._select_bars(inputs[symbol]))
+            except Exception as e:
+                self.update_state(f'error_processing_{symbol}', str(e))
+        return batch
+    
+    def _select_bars(self, data: Any) -> Any:
+        """Pick the longest bar series among a symbol's provider payloads."""
+        if isinstance(data, dict) and 'timestamp' not in data:
+            series = [payload for payload in data.values() if _is_bar_series(payload)]
+            if series:
+                return max(series, key=_series_length)
+        return data
+    
+    def _convert_to_columns(self, data: Any) -> Dict[str, np.ndarray]:
+        """Convert API response data to typed column arrays."""
+        # Column arrays, e.g. views of the memory-mapped bar store, are used as-is
+        if isinstance(data, dict) and 'timestamp' in data:
+            return data
         elif isinstance(data, list):
-            return pd.DataFrame(data)
+            return records_to_columns(data)
         else:
             raise ValueError(f'Unsupported data format: {type(data)}')
     
-    def _apply_cleaning_rules(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Apply cleaning rules to the DataFrame."""
-        if 'remove_nulls' in self.cleaning_rules:
-            df = df.dropna()
-        
-        if 'handle_outliers' in self.cleaning_rules:
-            # Use IQR method to remove outliers
-            Q1 = df.quantile(0.25)
-            Q3 = df.quantile(0.75)
-            IQR = Q3 - Q1
-            df = df[~((df < (Q1 - 1.5 * IQR)) | (df > (Q3 + 1.5 * IQR))).any(axis=1)]
-        
-        return df
-    
-    def _normalize_data(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Normalize numerical columns in the DataFrame."""
-        numeric_columns = df.select_dtypes(include=[np.number]).columns
-        if not numeric_columns.empty:
-            df[numeric_columns] = (df[numeric_columns] - df[numeric_columns].mean()) / df[numeric_columns].std()
-        return df
+    async def aclose(self) -> None:
+        """Stop the executor's worker pool."""
+        self.executor.shutdown()
     
     def process_message(self, message: BaseMessage) -> Dict[str, Any]:
         """Process messages from other agents containing data for processing.
@@ -100,4 +123,66 @@ class DataProcessingAgent(BaseAgent):
         content = message.content
         if isinstance(content, dict):
             return self.run(content, RunnableConfig())
-        return {}
\ No newline at end of file
+        return {}
+
+def _is_bar_series(payload: Any) -> bool:
+    return isinstance(payload, list) or (isinstance(payload, dict) and 'timestamp' in payload)
+
+def _series_length(payload: Any) -> int:
+    return len(payload['timestamp']) if isinstance(payload, dict) else len(payload)
+
+def _process_batch(batch: Dict[str, Dict[str, np.ndarray]], cleaning_rules: List[str],
+                   normalization: bool) -> Tuple[Dict[str, Dict[str, np.ndarray]], Dict[str, str]]:
+    """Clean and normalize a batch of symbols; runs on a CPUExecutor worker.
+
+    Returns:
+        Tuple[Dict[str, Dict[str, np.ndarray]], Dict[str, str]]: Processed columns
+            and error messages, each keyed by symbol
+    """
+    processed, errors = {}, {}
+    for symbol, columns in batch.items():
+        try:
+            columns = _apply_cleaning_rules(columns, cleaning_rules)
+            if normalization:
+                columns = _normalize_data(columns)
+            processed[symbol] = columns
+        except Exception as e:
+            errors[symbol] = str(e)
+    return processed, errors
+
+def _apply_cleaning_rules(columns: Dict[str, np.ndarray], cleaning_rules: List[str]) -> Dict[str, np.ndarray]:
+    """Apply cleaning rules to the columns, copying them only if bars are dropped."""
+    keep = np.ones(len(columns['timestamp']), dtype=bool)
+    if 'remove_nulls' in cleaning_rules:
+        for values in columns.values():
+            if values.dtype.kind == 'f':
+                keep &= ~np.isnan(values)
+
+    if 'handle_outliers' in cleaning_rules and 'close' in columns:
+        # Use IQR method on bar-to-bar returns, so a trending price is not an outlier
+        close = columns['close'][keep]
+        returns = np.full(len(close), np.nan)
+        if len(close) > 1:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                returns[1:] = close[1:] / close[:-1] - 1
+        if np.isfinite(returns).any():
+            Q1, Q3 = np.nanpercentile(returns, [25, 75])
+            IQR = Q3 - Q1
+            outliers = (returns < (Q1 - 3 * IQR)) | (returns > (Q3 + 3 * IQR))
+            keep[np.flatnonzero(keep)[outliers]] = False
+
+    if keep.all():
+        return columns
+    return {name: values[keep] for name, values in columns.items()}
+
+def _normalize_data(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Normalize numerical columns into additional *_normalized columns."""
+    # Raw prices stay untouched for the indicators; normalized copies get a suffix
+    normalized = {}
+    for name, values in columns.items():
+        if name == 'timestamp' or name.endswith('_normalized') or len(values) < 2:
+            continue
+        values = values.astype(np.float64)
+        std = np.nanstd(values, ddof=1)
+        normalized[f'{name}_normalized'] = (values - np.nanmean(values)) / std if std else np.full(len(values), np.nan)
+    return {**columns, **normalized}
@@ -0,0 +1,211 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Dict, Any, Callable, Optional
+import httpx
+from .rate_limiter import ProviderScheduler, ThrottledError
+
+# Alpha Vantage reports exhausted quotas with HTTP 200 and one of these keys
+THROTTLE_KEYS = ('Note', 'Information')
+
+# Failures worth another attempt; other 4xx responses are returned as-is
+RETRYABLE_ERRORS = (httpx.TransportError, httpx.HTTPStatusError, ThrottledError)
+
+class LatencyTracker:
+    """Rolling window of successful request latencies for one provider."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, fraction: float, min_samples: int) -> Optional[float]:
+        """Get a latency percentile, or None until enough samples were seen."""
+        if len(self.samples) < min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+class FetchClient:
+    """Shared async HTTP client for the market data providers.
+
+    All requests go through one connection pool. Each provider additionally
+    gets its own semaphore so a slow or strict provider cannot use up the
+    whole pool. When a scheduler is given, every request first waits for a
+    token from the provider's rate limit.
+
+    Failed requests are retried with jittered exponential backoff. With
+    hedging enabled, a request that outlives the provider's recent p95
+    latency gets a duplicate and the first successful answer wins.
+    """
+
+    def __init__(self, config: Dict[str, Any], scheduler: Optional[ProviderScheduler] = None):
+        """Initialize the fetch client.
+
+        Args:
+            config (Dict[str, Any]): The data_fetching section of AGENT_CONFIG
+            scheduler (Optional[ProviderScheduler]): Per-provider rate limiter
+        """
+        self.timeout = config['request_timeout']
+        self.retry_attempts = config['retry_attempts']
+        self.max_concurrency = config.get('max_concurrency', {})
+        self.max_connections = config.get('max_connections', 100)
+        self.backoff = config.get('backoff', {})
+        self.hedging = config.get('hedging', {})
+        self.scheduler = scheduler
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._latencies: Dict[str, LatencyTracker] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client, creating it on first use."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    def _get_semaphore(self, provider: str) -> asyncio.Semaphore:
+        """Return the concurrency limiter for a provider."""
+        if provider not in self._semaphores:
+            self._semaphores[provider] = asyncio.Semaphore(self.max_concurrency.get(provider, 5))
+        return self._semaphores[provider]
+
+    def _get_stats(self, provider: str) -> Dict[str, int]:
+        if provider not in self._stats:
+            self._stats[provider] = {'retries': 0, 'hedges': 0, 'hedges_won': 0}
+            self._latencies[provider] = LatencyTracker(self.hedging.get('window', 200))
+        return self._stats[provider]
+
+    async def get_json(self, provider: str, url: str, params: Optional[Dict[str, Any]] = None,
+                       headers: Optional[Dict[str, str]] = None,
+                       decode: Optional[Callable[[bytes], Any]] = None) -> Any:
+        """Issue a GET request against a provider and decode the JSON body.
+
+        Args:
+            provider (str): Provider name used for concurrency limiting
+            url (str): Request URL
+            params (Optional[Dict[str, Any]]): Query string parameters
+            headers (Optional[Dict[str, str]]): Request headers
+            decode (Optional[Callable[[bytes], Any]]): Decoder for the raw body, such as
+                a provider normalizer; plain JSON decoding by default
+
+        Returns:
+            Any: Decoded JSON response
+
+        Raises:
+            ThrottledError: If the provider kept rejecting the request for exceeding its quota
+            httpx.HTTPError: If the request kept failing after all retry attempts
+        """
+        stats = self._get_stats(provider)
+        for attempt in range(self.retry_attempts + 1):
+            try:
+                return await self._hedged_get(provider, url, params, headers, decode)
+            except RETRYABLE_ERRORS:
+                if attempt >= self.retry_attempts:
+                    raise
+                stats['retries'] += 1
+                await asyncio.sleep(self._backoff_delay(attempt))
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        base = self.backoff.get('base_seconds', 0.5)
+        cap = self.backoff.get('max_seconds', 8.0)
+        return random.uniform(0, min(cap, base * 2 ** attempt))
+
+    async def _hedged_get(self, provider: str, url: str, params: Optional[Dict[str, Any]],
+                          headers: Optional[Dict[str, str]], decode: Optional[Callable[[bytes], Any]]) -> Any:
+        """Send a request, hedging it once it runs past the provider's tail latency."""
+        sent = asyncio.Event()
+        primary = asyncio.ensure_future(self._get(provider, url, params, headers, decode, sent=sent))
+        hedge_after = None
+        if self.hedging.get('enabled'):
+            hedge_after = self._latencies[provider].percentile(
+                self.hedging.get('percentile', 0.95), self.hedging.get('min_samples', 20)
+            )
+        if hedge_after is None:
+            return await primary
+
+        # Start the hedge timer once the request is on the wire, not while it queues
+        sent_waiter = asyncio.ensure_future(sent.wait())
+        await asyncio.wait({primary, sent_waiter}, return_when=asyncio.FIRST_COMPLETED)
+        sent_waiter.cancel()
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        # Hedges never queue for quota; without a spare token keep waiting on the original
+        if done or (self.scheduler is not None and not self.scheduler.try_acquire_now(provider)):
+            return await primary
+
+        stats = self._stats[provider]
+        stats['hedges'] += 1
+        hedge = asyncio.ensure_future(self._get(provider, url, params, headers, decode, scheduled=False))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Retrieve every finished result so no failure goes unobserved
+                errors = {task: task.exception() for task in done}
+                for task, task_error in errors.items():
+                    if task_error is None:
+                        if task is hedge:
+                            stats['hedges_won'] += 1
+                        return task.result()
+                    error = task_error
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _get(self, provider: str, url: str, params: Optional[Dict[str, Any]],
+                   headers: Optional[Dict[str, str]], decode: Optional[Callable[[bytes], Any]] = None,
+                   scheduled: bool = True,
+                   sent: Optional[asyncio.Event] = None) -> Any:
+        """Send a single request and validate the response."""
+        if scheduled and self.scheduler is not None:
+            await self.scheduler.acquire(provider)
+        async with self._get_semaphore(provider):
+            if sent is not None:
+                sent.set()
+            started = time.monotonic()
+            response = await self._get_client().get(url, params=params, headers=headers)
+            elapsed = time.monotonic() - started
+
+        if response.status_code == 429:
+            self._throttled(provider, float(response.headers.get('Retry-After', 0) or 0))
+        if response.status_code >= 500:
+            response.raise_for_status()
+        payload = decode(response.content) if decode is not None else response.json()
+        if isinstance(payload, dict) and any(key in payload for key in THROTTLE_KEYS):
+            self._throttled(provider)
+
+        self._latencies[provider].record(elapsed)
+        return payload
+
+    def _throttled(self, provider: str, retry_after: float = 0.0) -> None:
+        """Report a throttled response to the scheduler and fail the request."""
+        if self.scheduler is not None:
+            self.scheduler.record_throttle(provider, retry_after)
+        raise ThrottledError(f'{provider} rate limit exceeded')
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get retry, hedging and latency metrics for every provider."""
+        metrics = {}
+        for provider, stats in self._stats.items():
+            metrics[provider] = {
+                **stats,
+                'p95_latency_seconds': self._latencies[provider].percentile(0.95, 1)
+            }
+        return metrics
+
+    async def aclose(self) -> None:
+        """Close the shared connection pool."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
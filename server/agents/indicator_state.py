@@ -0,0 +1,506 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+from array import array
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+import numpy as np
+from .indicators import (
+    METRIC_KEYS, MOMENTUM_PERIOD, MOVING_AVERAGE_WINDOWS, RSI_PERIOD, TRADING_DAYS_PER_YEAR,
+    VOLUME_TREND_WINDOW, build_price_matrix, rsi_from_averages, wilder_state
+)
+
+class RingWindow:
+    """Fixed-capacity window over the most recent values with running sums.
+
+    Keeps the total and total of squares of the whole window plus running sums
+    of the newest `tails` values, so window statistics and trailing averages
+    never need a scan. The sums are recomputed exactly once per `capacity`
+    pushes to stop floating point drift.
+    """
+
+    def __init__(self, capacity: int, tails: Sequence[int] = ()):
+        self.capacity = max(capacity, 1)
+        self.values = array('d', bytes(8 * self.capacity))
+        self.end = 0
+        self.size = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.tails = {tail: 0.0 for tail in tails if tail <= self.capacity}
+        self.pushes = 0
+
+    def ago(self, offset: int) -> float:
+        """Value `offset` positions before the newest one."""
+        return self.values[(self.end - 1 - offset) % self.capacity]
+
+    def oldest(self, offset: int) -> float:
+        """Value `offset` positions after the oldest one."""
+        return self.values[(self.end - self.size + offset) % self.capacity]
+
+    def head_sum(self, count: int) -> float:
+        """Sum of the `count` oldest values."""
+        return sum(self.oldest(offset) for offset in range(count))
+
+    def ordered(self) -> array:
+        """Values from oldest to newest."""
+        start = (self.end - self.size) % self.capacity
+        if start + self.size <= self.capacity:
+            return self.values[start:start + self.size]
+        return self.values[start:] + self.values[:self.end]
+
+    def load(self, values: np.ndarray) -> None:
+        """Replace the contents with the newest `capacity` of values, oldest first."""
+        values = np.ascontiguousarray(values[-self.capacity:], dtype=float)
+        self.values[:len(values)] = array('d', values.tobytes())
+        self.size = len(values)
+        self.end = self.size % self.capacity
+        self.total = float(np.sum(values))
+        self.total_sq = float(np.sum(values * values))
+        for tail in self.tails:
+            self.tails[tail] = float(np.sum(values[-tail:]))
+        self.pushes = 0
+
+    def push(self, value: float) -> Optional[float]:
+        """Append a value, returning the one evicted to make room (None while filling)."""
+        for tail in self.tails:
+            if self.size >= tail:
+                self.tails[tail] -= self.ago(tail - 1)
+            self.tails[tail] += value
+        evicted = self.values[self.end] if self.size == self.capacity else None
+        if evicted is None:
+            self.size += 1
+        else:
+            self.total -= evicted
+            self.total_sq -= evicted * evicted
+        self.values[self.end] = value
+        self.end = (self.end + 1) % self.capacity
+        self.total += value
+        self.total_sq += value * value
+        self.pushes += 1
+        if self.pushes >= self.capacity:
+            self._resync()
+        return evicted
+
+    def undo(self, evicted: Optional[float]) -> None:
+        """Take back the newest push, given the value it returned."""
+        self.end = (self.end - 1) % self.capacity
+        value = self.values[self.end]
+        self.total -= value
+        self.total_sq -= value * value
+        if evicted is None:
+            self.size -= 1
+        else:
+            self.values[self.end] = evicted
+            self.total += evicted
+            self.total_sq += evicted * evicted
+        for tail in self.tails:
+            self.tails[tail] -= value
+            if self.size >= tail:
+                self.tails[tail] += self.ago(tail - 1)
+
+    def _resync(self) -> None:
+        ordered = self.ordered()
+        self.total = math.fsum(ordered)
+        self.total_sq = math.fsum(value * value for value in ordered)
+        for tail in self.tails:
+            self.tails[tail] = math.fsum(ordered[-tail:]) if self.size >= tail else math.fsum(ordered)
+        self.pushes = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'capacity': self.capacity, 'end': self.end, 'size': self.size, 'total': self.total,
+            'total_sq': self.total_sq, 'tails': list(self.tails.items()), 'pushes': self.pushes
+        }
+
+    @classmethod
+    def from_dict(cls, header: Dict[str, Any], values: bytes) -> 'RingWindow':
+        window = cls(header['capacity'])
+        window.values = array('d')
+        window.values.frombytes(values)
+        window.end, window.size, window.pushes = header['end'], header['size'], header['pushes']
+        window.total, window.total_sq = header['total'], header['total_sq']
+        window.tails = {int(tail): total for tail, total in header['tails']}
+        return window
+
+class IndicatorState:
+    """Running indicator state of one symbol's bar series.
+
+    Holds windows of the latest closes, volumes, bar ranges and returns, sized
+    to the bar count of the series it was built from, plus Wilder-smoothed
+    gains and losses. Appending a bar updates every metric in constant time.
+    The latest bar can be replaced, as providers revise a bar until it closes.
+    """
+
+    # Ring windows persisted as raw float arrays
+    WINDOWS = ('closes', 'volumes', 'ranges', 'returns')
+
+    def __init__(self, capacity: int):
+        self.closes = RingWindow(capacity, MOVING_AVERAGE_WINDOWS + (MOMENTUM_PERIOD,))
+        self.volumes = RingWindow(capacity, (VOLUME_TREND_WINDOW,))
+        self.ranges = RingWindow(capacity)
+        self.returns = RingWindow(capacity - 1)
+        self.prev_close: Optional[float] = None
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.seen = 0
+        self.last_ts: Optional[int] = None
+        self.last_bar: Optional[List[float]] = None
+        self._undo: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_matrix_row(cls, matrix: Dict[str, np.ndarray], row: int, columns: Dict[str, np.ndarray],
+                        avg_gain: float, avg_loss: float, seen: int) -> 'IndicatorState':
+        """Build the state for a whole series from its row of a price matrix.
+
+        Args:
+            matrix (Dict[str, np.ndarray]): Price matrix of all bars but each series' last
+            row (int): Row of the series in the matrix
+            columns (Dict[str, np.ndarray]): The whole series' bar columns
+            avg_gain (float): Wilder average gain over the matrix row
+            avg_loss (float): Wilder average loss over the matrix row
+            seen (int): Number of price changes behind those averages
+
+        Returns:
+            IndicatorState: State as if every bar had been pushed
+        """
+        timestamps = columns['timestamp']
+        state = cls(len(timestamps))
+        head = len(timestamps) - 1
+        closes = matrix['close'][row, matrix['close'].shape[1] - head:]
+        highs = matrix['high'][row, -head:] if head else closes
+        lows = matrix['low'][row, -head:] if head else closes
+        state.closes.load(closes)
+        state.volumes.load(np.nan_to_num(matrix['volume'][row, -head:]) if head else closes)
+        state.ranges.load(np.where(np.isnan(highs), closes, highs) - np.where(np.isnan(lows), closes, lows))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = closes[1:] / closes[:-1] - 1
+        state.returns.load(returns[np.isfinite(returns)])
+        state.avg_gain, state.avg_loss, state.seen = float(avg_gain), float(avg_loss), int(seen)
+        if head:
+            state.prev_close = float(closes[-1])
+            state.last_ts = int(timestamps[-2])
+        # The last bar goes through push() so it can later be replaced
+        state.push(_bar_at(columns, head))
+        return state
+
+    def apply(self, columns: Dict[str, np.ndarray]) -> bool:
+        """Feed the bars newer than the state, revising the latest one if it changed.
+
+        Args:
+            columns (Dict[str, np.ndarray]): The symbol's current bar columns in time order
+
+        Returns:
+            bool: False if the series no longer lines up with the state and it has to be rebuilt
+        """
+        timestamps = columns['timestamp']
+        index = int(np.searchsorted(timestamps, self.last_ts, side='right')) - 1
+        if index < 0 or timestamps[index] != self.last_ts or self._undo is None:
+            return False
+        if len(timestamps) - 1 - index >= self.closes.capacity:
+            return False
+        latest = _bar_at(columns, index)
+        if _bar_values(latest) != self.last_bar:
+            self.replace_last(latest)
+        for position in range(index + 1, len(timestamps)):
+            self.push(_bar_at(columns, position))
+        return True
+
+    def push(self, bar: Dict[str, Any]) -> None:
+        """Append a bar and update every running statistic."""
+        close, volume, high, low = _bar_values(bar)
+        undo = {
+            'closes': self.closes.push(close),
+            'volumes': self.volumes.push(volume),
+            'ranges': self.ranges.push(high - low),
+            'returns': None,
+            'pushed_return': False,
+            'rsi': [self.avg_gain, self.avg_loss, self.seen, self.prev_close],
+            'last': [self.last_ts, self.last_bar]
+        }
+        if self.prev_close:
+            undo['returns'] = self.returns.push(close / self.prev_close - 1)
+            undo['pushed_return'] = True
+        if self.prev_close is not None:
+            change = close - self.prev_close
+            self.seen += 1
+            self.avg_gain = _wilder_step(self.avg_gain, max(change, 0.0), self.seen)
+            self.avg_loss = _wilder_step(self.avg_loss, max(-change, 0.0), self.seen)
+        self.prev_close = close
+        self.last_ts = bar['timestamp']
+        self.last_bar = [close, volume, high, low]
+        self._undo = undo
+
+    def replace_last(self, bar: Dict[str, Any]) -> None:
+        """Swap the latest bar for a revised version of it."""
+        undo = self._undo
+        if undo['pushed_return']:
+            self.returns.undo(undo['returns'])
+        for name in ('closes', 'volumes', 'ranges'):
+            getattr(self, name).undo(undo[name])
+        self.avg_gain, self.avg_loss, self.seen, self.prev_close = undo['rsi']
+        self.last_ts, self.last_bar = undo['last']
+        self.push(bar)
+
+    def snapshot(self, metrics: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """Get the configured metrics in the same layout as indicators_to_records().
+
+        Args:
+            metrics (Sequence[str]): Metric names from the analysis configuration
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Indicators keyed by output key; values that
+                cannot be computed yet are None
+        """
+        calculators = {
+            'price_momentum': self._momentum,
+            'volume_analysis': self._volume,
+            'volatility': self._volatility,
+            'moving_averages': self._moving_averages,
+            'relative_strength': self._relative_strength,
+        }
+        return {METRIC_KEYS[metric]: calculators[metric]() for metric in metrics if metric in calculators}
+
+    def _momentum(self) -> Dict[str, Any]:
+        closes = self.closes
+        momentum = None
+        if closes.size > MOMENTUM_PERIOD:
+            # The mean of close[t] - close[t - period] telescopes to the newest minus the oldest closes
+            span = min(MOMENTUM_PERIOD, closes.size - MOMENTUM_PERIOD)
+            newest = closes.tails[MOMENTUM_PERIOD] if span == MOMENTUM_PERIOD else sum(closes.ago(offset) for offset in range(span))
+            momentum = (newest - closes.head_sum(span)) / (closes.size - MOMENTUM_PERIOD)
+        return {
+            'momentum_14d': momentum,
+            'momentum_trend': 'positive' if momentum is not None and momentum > 0 else 'negative'
+        }
+
+    def _volume(self) -> Dict[str, Any]:
+        volumes = self.volumes
+        increasing = (
+            volumes.size >= VOLUME_TREND_WINDOW
+            and volumes.tails[VOLUME_TREND_WINDOW] > volumes.head_sum(VOLUME_TREND_WINDOW)
+        )
+        return {
+            'average_volume': volumes.total / volumes.size if volumes.size else None,
+            'volume_trend': 'increasing' if increasing else 'decreasing'
+        }
+
+    def _volatility(self) -> Dict[str, Any]:
+        returns = self.returns
+        volatility = None
+        if returns.size >= 2:
+            variance = (returns.total_sq - returns.total ** 2 / returns.size) / (returns.size - 1)
+            volatility = math.sqrt(max(variance, 0.0)) * math.sqrt(TRADING_DAYS_PER_YEAR) * 100
+        return {
+            'volatility': volatility,
+            'avg_daily_range': self.ranges.total / self.ranges.size if self.ranges.size else None
+        }
+
+    def _moving_averages(self) -> Dict[str, Any]:
+        closes = self.closes
+        averages = [
+            closes.tails[window] / window if window in closes.tails and closes.size >= window else None
+            for window in MOVING_AVERAGE_WINDOWS
+        ]
+        ma_20, ma_50, ma_200 = averages
+        trend = 'neutral'
+        if None not in averages:
+            if ma_20 > ma_50 > ma_200:
+                trend = 'strong_uptrend'
+            elif ma_20 > ma_50 and ma_50 < ma_200:
+                trend = 'potential_reversal_up'
+            elif ma_20 < ma_50 < ma_200:
+                trend = 'strong_downtrend'
+            elif ma_20 < ma_50 and ma_50 > ma_200:
+                trend = 'potential_reversal_down'
+        return {'ma_20': ma_20, 'ma_50': ma_50, 'ma_200': ma_200, 'trend': trend}
+
+    def _relative_strength(self) -> Dict[str, Any]:
+        rsi = None
+        if self.seen >= RSI_PERIOD:
+            rsi = float(rsi_from_averages(np.float64(self.avg_gain), np.float64(self.avg_loss)))
+        trend = 'neutral'
+        if rsi is not None and rsi > 70:
+            trend = 'overbought'
+        elif rsi is not None and rsi < 30:
+            trend = 'oversold'
+        return {'rsi': rsi, 'rsi_trend': trend}
+
+    def to_row(self) -> Tuple[str, ...]:
+        """Serialize into a header and one raw array per window."""
+        header = {
+            'windows': {name: getattr(self, name).to_dict() for name in self.WINDOWS},
+            'prev_close': self.prev_close,
+            'rsi': [self.avg_gain, self.avg_loss, self.seen],
+            'last_ts': self.last_ts,
+            'last_bar': self.last_bar,
+            'undo': self._undo
+        }
+        return (json.dumps(header),) + tuple(getattr(self, name).values.tobytes() for name in self.WINDOWS)
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> 'IndicatorState':
+        header = json.loads(row[0])
+        state = cls.__new__(cls)
+        for name, values in zip(cls.WINDOWS, row[1:]):
+            setattr(state, name, RingWindow.from_dict(header['windows'][name], values))
+        state.prev_close = header['prev_close']
+        state.avg_gain, state.avg_loss, state.seen = header['rsi']
+        state.last_ts = header['last_ts']
+        state.last_bar = header['last_bar']
+        state._undo = header['undo']
+        return state
+
+def _bar_at(columns: Dict[str, np.ndarray], index: int) -> Dict[str, Any]:
+    """Read one bar out of column arrays as plain Python values, None where missing."""
+    bar = {'timestamp': int(columns['timestamp'][index])}
+    for field in ('close', 'volume', 'high', 'low'):
+        value = float(columns[field][index]) if field in columns else math.nan
+        bar[field] = None if math.isnan(value) else value
+    return bar
+
+def _bar_values(bar: Dict[str, Any]) -> List[float]:
+    """Close, volume, high and low of a bar, with missing fields as 0 (or the close)."""
+    close = float(bar['close'])
+    high = bar.get('high')
+    low = bar.get('low')
+    return [
+        close,
+        float(bar.get('volume') or 0.0),
+        float(high) if high is not None else close,
+        float(low) if low is not None else close
+    ]
+
+def _wilder_step(average: float, value: float, seen: int) -> float:
+    """Advance a Wilder average by one value, matching indicators.wilder_state()."""
+    if seen <= RSI_PERIOD:
+        return average + value / RSI_PERIOD
+    return (average * (RSI_PERIOD - 1) + value) / RSI_PERIOD
+
+def advance_states(states: Dict[str, IndicatorState], series: Dict[str, Dict[str, np.ndarray]]
+                   ) -> Tuple[Dict[str, IndicatorState], Dict[str, Dict[str, np.ndarray]]]:
+    """Feed the latest bar series into the stored indicator states.
+
+    States that line up with their series only take the new bars. Bars
+    without a close are left out.
+
+    Args:
+        states (Dict[str, IndicatorState]): Stored states keyed by symbol
+        series (Dict[str, Dict[str, np.ndarray]]): Bar columns in time order, keyed by symbol
+
+    Returns:
+        Tuple[Dict[str, IndicatorState], Dict[str, Dict[str, np.ndarray]]]: The
+            updated states, and the priced bar columns of the symbols without a
+            usable state, for rebuild_states(), each keyed by symbol
+    """
+    updated = {}
+    rebuild = {}
+    for symbol, columns in series.items():
+        if 'timestamp' not in columns or 'close' not in columns:
+            continue
+        priced = ~np.isnan(columns['close'])
+        if not priced.all():
+            columns = {name: values[priced] for name, values in columns.items()}
+        if not len(columns['close']):
+            continue
+        state = states.get(symbol)
+        if state is not None and state.apply(columns):
+            updated[symbol] = state
+        else:
+            rebuild[symbol] = columns
+    return updated, rebuild
+
+def rebuild_states(series: Dict[str, Dict[str, np.ndarray]]) -> Dict[str, IndicatorState]:
+    """Build indicator states for whole bar series, with Wilder's smoothing vectorized across all of them.
+
+    Args:
+        series (Dict[str, Dict[str, np.ndarray]]): Priced bar columns in time order,
+            keyed by symbol, as returned by advance_states()
+
+    Returns:
+        Dict[str, IndicatorState]: New states keyed by symbol
+    """
+    if not series:
+        return {}
+    symbols, matrix = build_price_matrix({
+        symbol: {name: values[:-1] for name, values in columns.items()}
+        for symbol, columns in series.items()
+    })
+    avg_gain, avg_loss, seen = wilder_state(matrix['close'], RSI_PERIOD)
+    return {
+        symbol: IndicatorState.from_matrix_row(matrix, row, series[symbol], avg_gain[row], avg_loss[row], seen[row])
+        for row, symbol in enumerate(symbols)
+    }
+
+class IndicatorStateStore:
+    """Persistent SQLite store of indicator states keyed by symbol and timeframe.
+
+    Methods are blocking; call them from a worker thread inside async code.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """Initialize the store and create its table if needed.
+
+        Args:
+            config (Dict[str, Any]): The analysis 'indicator_state' configuration
+        """
+        self.path = config['path']
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS indicator_states (
+                symbol TEXT NOT NULL,
+                timeframe TEXT NOT NULL,
+                header TEXT NOT NULL,
+                closes BLOB NOT NULL,
+                volumes BLOB NOT NULL,
+                ranges BLOB NOT NULL,
+                returns BLOB NOT NULL,
+                PRIMARY KEY (symbol, timeframe)
+            )'''
+        )
+        self._conn.commit()
+
+    def get_many(self, timeframe: str, symbols: List[str]) -> Dict[str, IndicatorState]:
+        """Load the stored states of several symbols.
+
+        Args:
+            timeframe (str): Analysis timeframe the states were built for
+            symbols (List[str]): Symbols to load
+
+        Returns:
+            Dict[str, IndicatorState]: States keyed by symbol; unknown symbols are left out
+        """
+        states = {}
+        with self._lock:
+            for start in range(0, len(symbols), 500):
+                chunk = symbols[start:start + 500]
+                rows = self._conn.execute(
+                    f'''SELECT symbol, header, closes, volumes, ranges, returns FROM indicator_states
+                        WHERE timeframe = ? AND symbol IN ({",".join("?" * len(chunk))})''',
+                    (timeframe, *chunk)
+                ).fetchall()
+                for row in rows:
+                    states[row[0]] = IndicatorState.from_row(row[1:])
+        return states
+
+    def set_many(self, timeframe: str, states: Dict[str, IndicatorState]) -> None:
+        """Store the states of several symbols.
+
+        Args:
+            timeframe (str): Analysis timeframe the states were built for
+            states (Dict[str, IndicatorState]): States keyed by symbol
+        """
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO indicator_states VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(symbol, timeframe, *state.to_row()) for symbol, state in states.items()]
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
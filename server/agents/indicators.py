@@ -0,0 +1,251 @@
+import warnings
+from typing import Dict, Any, List, Sequence, Tuple
+import numpy as np
+
+# Fields stacked into the price matrix, one symbols x time array each
+MATRIX_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+# Output key of each configured analysis metric, as read by StrategyAgent
+METRIC_KEYS = {
+    'price_momentum': 'momentum',
+    'volume_analysis': 'volume',
+    'volatility': 'volatility',
+    'moving_averages': 'moving_averages',
+    'relative_strength': 'relative_strength',
+}
+
+MOMENTUM_PERIOD = 14
+VOLUME_TREND_WINDOW = 5
+MOVING_AVERAGE_WINDOWS = (20, 50, 200)
+RSI_PERIOD = 14
+TRADING_DAYS_PER_YEAR = 252
+
+def build_price_matrix(series: Dict[str, Dict[str, np.ndarray]]) -> Tuple[List[str], Dict[str, np.ndarray]]:
+    """Stack per-symbol bar columns into symbols x time arrays.
+
+    Series are aligned on their most recent bar, so the last column holds every
+    symbol's latest bar; shorter histories are padded with NaN on the left.
+    The matrix is float64 whatever the column types; float32 prices from the
+    bar store are widened as they are copied in.
+
+    Args:
+        series (Dict[str, Dict[str, np.ndarray]]): Bar column arrays in time order, keyed by symbol
+
+    Returns:
+        Tuple[List[str], Dict[str, np.ndarray]]: Symbols in row order and one
+            float matrix per field in MATRIX_FIELDS
+    """
+    symbols = list(series)
+    length = max((len(columns['close']) for columns in series.values()), default=0)
+    matrix = {field: np.full((len(symbols), length), np.nan) for field in MATRIX_FIELDS}
+    for row, symbol in enumerate(symbols):
+        columns = series[symbol]
+        size = len(columns['close'])
+        if not size:
+            continue
+        for field in MATRIX_FIELDS:
+            if field in columns:
+                matrix[field][row, length - size:] = columns[field]
+    return symbols, matrix
+
+def compute_indicators(matrix: Dict[str, np.ndarray], metrics: Sequence[str]) -> Dict[str, Dict[str, np.ndarray]]:
+    """Compute the configured metrics for every symbol at once.
+
+    Args:
+        matrix (Dict[str, np.ndarray]): Price matrix from build_price_matrix()
+        metrics (Sequence[str]): Metric names from the analysis configuration
+
+    Returns:
+        Dict[str, Dict[str, np.ndarray]]: Per output key, indicator arrays with one entry per symbol
+    """
+    calculators = {
+        'price_momentum': _momentum,
+        'volume_analysis': _volume,
+        'volatility': _volatility,
+        'moving_averages': _moving_averages,
+        'relative_strength': _relative_strength,
+    }
+    # Symbols with too little history yield NaN; numpy warns about every such row
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return {
+            METRIC_KEYS[metric]: calculators[metric](matrix)
+            for metric in metrics if metric in calculators
+        }
+
+def indicators_to_records(symbols: List[str], indicators: Dict[str, Dict[str, np.ndarray]]) -> Dict[str, Dict[str, Any]]:
+    """Split indicator arrays into per-symbol dictionaries of plain Python values.
+
+    Args:
+        symbols (List[str]): Symbols in row order
+        indicators (Dict[str, Dict[str, np.ndarray]]): Output of compute_indicators()
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Indicators keyed by symbol, then by output key;
+            values that could not be computed are None
+    """
+    columns = {
+        key: {name: values.tolist() for name, values in arrays.items()}
+        for key, arrays in indicators.items()
+    }
+    return {
+        symbol: {
+            key: {name: _to_python(values[row]) for name, values in named.items()}
+            for key, named in columns.items()
+        }
+        for row, symbol in enumerate(symbols)
+    }
+
+def _to_python(value: Any) -> Any:
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+def _last_valid(values: np.ndarray) -> np.ndarray:
+    """Take the most recent non-NaN value of every row."""
+    valid = ~np.isnan(values)
+    last = values.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    result = values[np.arange(values.shape[0]), last] if values.shape[1] else np.full(values.shape[0], np.nan)
+    return np.where(valid.any(axis=1), result, np.nan)
+
+def _first_valid(values: np.ndarray) -> np.ndarray:
+    """Take the oldest non-NaN value of every row."""
+    valid = ~np.isnan(values)
+    first = np.argmax(valid, axis=1)
+    result = values[np.arange(values.shape[0]), first] if values.shape[1] else np.full(values.shape[0], np.nan)
+    return np.where(valid.any(axis=1), result, np.nan)
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over the last `window` columns; NaN until a full window is available."""
+    rows, length = values.shape
+    result = np.full((rows, length), np.nan)
+    if length < window:
+        return result
+    filled = np.nan_to_num(values)
+    sums = np.cumsum(filled, axis=1)
+    counts = np.cumsum(~np.isnan(values), axis=1)
+    window_sums = sums[:, window - 1:] - np.concatenate([np.zeros((rows, 1)), sums[:, :-window]], axis=1)
+    window_counts = counts[:, window - 1:] - np.concatenate([np.zeros((rows, 1)), counts[:, :-window]], axis=1)
+    result[:, window - 1:] = np.where(window_counts == window, window_sums / window, np.nan)
+    return result
+
+def _trend_labels(positive: np.ndarray, labels: Tuple[str, str]) -> np.ndarray:
+    return np.where(positive, labels[0], labels[1])
+
+def _momentum(matrix: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Average change of the close over MOMENTUM_PERIOD bars."""
+    close = matrix['close']
+    if close.shape[1] <= MOMENTUM_PERIOD:
+        momentum = np.full(close.shape[0], np.nan)
+    else:
+        momentum = np.nanmean(close[:, MOMENTUM_PERIOD:] - close[:, :-MOMENTUM_PERIOD], axis=1)
+    return {
+        'momentum_14d': momentum,
+        'momentum_trend': _trend_labels(momentum > 0, ('positive', 'negative'))
+    }
+
+def _volume(matrix: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Average volume and whether its short rolling mean rose over the window."""
+    volume = matrix['volume']
+    average_volume = np.nanmean(volume, axis=1)
+    rolling = _rolling_mean(volume, VOLUME_TREND_WINDOW)
+    return {
+        'average_volume': average_volume,
+        'volume_trend': _trend_labels(_last_valid(rolling) > _first_valid(rolling), ('increasing', 'decreasing'))
+    }
+
+def _volatility(matrix: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Annualized volatility of bar returns, in percent, and the average bar range."""
+    close = matrix['close']
+    returns = close[:, 1:] / close[:, :-1] - 1
+    volatility = np.nanstd(returns, axis=1, ddof=1)
+    return {
+        'volatility': volatility * np.sqrt(TRADING_DAYS_PER_YEAR) * 100,
+        'avg_daily_range': np.nanmean(matrix['high'] - matrix['low'], axis=1)
+    }
+
+def _moving_averages(matrix: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Simple moving averages of the close at the latest bar and the trend they imply."""
+    close = matrix['close']
+    # Any missing bar in the window, including too short a history, leaves the average NaN
+    ma_20, ma_50, ma_200 = (
+        np.mean(close[:, -window:], axis=1) if close.shape[1] >= window else np.full(close.shape[0], np.nan)
+        for window in MOVING_AVERAGE_WINDOWS
+    )
+    trend = np.select(
+        [
+            (ma_20 > ma_50) & (ma_50 > ma_200),
+            (ma_20 > ma_50) & (ma_50 < ma_200),
+            (ma_20 < ma_50) & (ma_50 < ma_200),
+            (ma_20 < ma_50) & (ma_50 > ma_200),
+        ],
+        ['strong_uptrend', 'potential_reversal_up', 'strong_downtrend', 'potential_reversal_down'],
+        default='neutral'
+    )
+    return {'ma_20': ma_20, 'ma_50': ma_50, 'ma_200': ma_200, 'trend': trend}
+
+def _relative_strength(matrix: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Wilder's RSI over RSI_PERIOD bars at the latest bar."""
+    avg_gain, avg_loss = wilder_averages(matrix['close'], RSI_PERIOD)
+    rsi = rsi_from_averages(avg_gain, avg_loss)
+    return {
+        'rsi': rsi,
+        'rsi_trend': np.select([rsi > 70, rsi < 30], ['overbought', 'oversold'], default='neutral')
+    }
+
+def wilder_averages(close: np.ndarray, period: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Wilder-smoothed average gain and loss of every row at its latest bar.
+
+    Args:
+        close (np.ndarray): Symbols x time close prices, NaN-padded on the left
+        period (int): Smoothing period
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Average gain and average loss per symbol,
+            NaN for symbols with fewer than `period` changes
+    """
+    avg_gain, avg_loss, seen = wilder_state(close, period)
+    ready = seen >= period
+    return np.where(ready, avg_gain, np.nan), np.where(ready, avg_loss, np.nan)
+
+def wilder_state(close: np.ndarray, period: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Run Wilder's smoothing over every row, including rows still warming up.
+
+    The averages are seeded with the simple mean of the first `period` changes
+    and then smoothed with factor 1/period. The recursion steps along the time
+    axis only; each step is vectorized across all symbols.
+
+    Args:
+        close (np.ndarray): Symbols x time close prices, NaN-padded on the left
+        period (int): Smoothing period
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Running average gain, average
+            loss and number of price changes seen per symbol
+    """
+    rows = close.shape[0]
+    delta = close[:, 1:] - close[:, :-1]
+    gains = np.clip(delta, 0, None)
+    losses = np.clip(-delta, 0, None)
+    seen = np.zeros(rows, dtype=int)
+    avg_gain = np.zeros(rows)
+    avg_loss = np.zeros(rows)
+    for step in range(delta.shape[1]):
+        valid = ~np.isnan(delta[:, step])
+        seen += valid
+        gain = np.where(valid, gains[:, step], 0.0)
+        loss = np.where(valid, losses[:, step], 0.0)
+        warming = valid & (seen <= period)
+        smoothing = valid & (seen > period)
+        avg_gain = np.where(warming, avg_gain + gain / period,
+                            np.where(smoothing, (avg_gain * (period - 1) + gain) / period, avg_gain))
+        avg_loss = np.where(warming, avg_loss + loss / period,
+                            np.where(smoothing, (avg_loss * (period - 1) + loss) / period, avg_loss))
+    return avg_gain, avg_loss, seen
+
+def rsi_from_averages(avg_gain: np.ndarray, avg_loss: np.ndarray) -> np.ndarray:
+    """Convert average gains and losses into RSI values."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    # No losses at all means maximum strength rather than a division error
+    return np.where((avg_loss == 0) & (avg_gain > 0), 100.0, np.where((avg_loss == 0) & (avg_gain == 0), 50.0, rsi))
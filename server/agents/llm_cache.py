@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+class LLMCache:
+    """Persistent SQLite cache for LLM analyses keyed by model, temperature and prompt.
+
+    Entries expire after a fixed TTL and the cache is bounded by entry count,
+    evicting the least recently used entries first.
+
+    Methods are blocking; call them from a worker thread inside async code.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """Initialize the cache and create its table if needed.
+
+        Args:
+            config (Dict[str, Any]): The analysis 'llm_cache' configuration
+        """
+        self.path = config['path']
+        self.ttl_seconds = config.get('ttl_seconds', 900)
+        self.max_entries = config.get('max_entries', 2000)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS analyses (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )'''
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS analyses_lru ON analyses (last_access)')
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, prompt: str) -> str:
+        """Hash the model settings and prompt into a cache key."""
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        return f'{model}:{temperature}:{prompt_hash}'
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached analysis if present and not expired.
+
+        Args:
+            key (str): Key from make_key()
+
+        Returns:
+            Optional[Dict[str, Any]]: Cached analysis result, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT result, expires_at FROM analyses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                self._stats['misses'] += 1
+                if row is not None:
+                    self._stats['expired'] += 1
+                return None
+            self._conn.execute('UPDATE analyses SET last_access = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            self._stats['hits'] += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        """Store an analysis and evict least recently used entries over the limit.
+
+        Args:
+            key (str): Key from make_key()
+            result (Dict[str, Any]): JSON-serializable analysis result
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?)',
+                (key, json.dumps(result), now + self.ttl_seconds, now)
+            )
+            count = self._conn.execute('SELECT COUNT(*) FROM analyses').fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    'DELETE FROM analyses WHERE key IN (SELECT key FROM analyses ORDER BY last_access LIMIT ?)',
+                    (count - self.max_entries,)
+                )
+                self._stats['evictions'] += count - self.max_entries
+            self._conn.commit()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get hit/miss counters and the number of cached analyses."""
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM analyses').fetchone()[0]
+        return {**self._stats, 'entries': entries}
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -1,18 +1,45 @@
+import asyncio
 import os
 # from openai import OpenAI
-from typing import Dict, Any, List
-from langfuse.openai import OpenAI
+import json
+import math
+from typing import Dict, Any, List, Optional, Tuple
+from langfuse.openai import AsyncOpenAI
+from .llm_cache import LLMCache
+from .micro_batcher import MicroBatcher
+
+SYSTEM_PROMPT = "You are an expert stock market analyst. Analyze the given stock data and provide insights."
+
+# Marks cache keys of analyses answered by the batch prompt
+BATCH_KEY_PREFIX = "batch\n"
 
 class LLMClient:
     """Client for handling OpenAI LLM interactions."""
     
-    def __init__(self):
+    def __init__(self, max_concurrency: int = 5, cache_config: Optional[Dict[str, Any]] = None,
+                 batch_size: int = 1, batch_linger_seconds: float = 0.05):
+        """Initialize the client.
+        
+        Args:
+            max_concurrency (int): Maximum number of LLM requests in flight at once
+            cache_config (Optional[Dict[str, Any]]): Analysis cache settings; no cache when omitted
+            batch_size (int): Maximum number of stocks per LLM call of analyze_stock_batched()
+            batch_linger_seconds (float): How long a partial batch of analyze_stock_batched()
+                waits for more stocks
+        """
         self.endpoint = "https://models.inference.ai.azure.com"
         self.token = os.environ["GITHUB_TOKEN"]
-        self.client = OpenAI(
+        self.client = AsyncOpenAI(
             base_url=self.endpoint,
             api_key=self.token,
         )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        cache_config = cache_config or {}
+        self.cache = LLMCache(cache_config) if cache_config.get('enabled') else None
+        self.bucket_numeric = cache_config.get('bucket_numeric', False)
+        self.batch_size = batch_size
+        # Stocks waiting to be sent together by analyze_stock_batched(), per AI settings
+        self.batcher = MicroBatcher(self._analyze_gathered, batch_size, batch_linger_seconds, share_duplicates=True)
     
     async def analyze_stock(self, stock_data: Dict[str, Any], ai_settings: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze stock data using the configured LLM.
@@ -32,40 +59,34 @@ class LLMClient:
             model_name = ai_settings.get('model', 'gpt-4o')
             temperature = ai_settings.get('temperature', 0.7)
             
+            # Identical (or, with bucketing, near-identical) prompts reuse a cached analysis
+            cache_key = self._cache_key(stock_data, model_name, temperature)
+            cached = await self._get_cached(cache_key)
+            if cached is not None:
+                return cached
+            
             # Call OpenAI API
-            response = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert stock market analyst. Analyze the given stock data and provide insights."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=temperature,
-                top_p=1.0,
-                max_tokens=1000,
-                model=model_name
-            )
+            async with self.semaphore:
+                response = await self.client.chat.completions.create(
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": SYSTEM_PROMPT
+                        },
+                        {
+                            "role": "user",
+                            "content": prompt
+                        }
+                    ],
+                    temperature=temperature,
+                    top_p=1.0,
+                    max_tokens=1000,
+                    model=model_name
+                )
             
             # Extract and structure the analysis
             analysis = response.choices[0].message.content
-            
-            # Format the response to match the frontend expectations
-            recommendation = {
-                'aiScore': self._calculate_ai_score(analysis),
-                'reason': self._extract_key_insights(analysis)
-            }
-            
-            return {
-                'status': 'success',
-                'analysis': analysis,
-                'recommendation': recommendation,
-                'model_used': model_name,
-                'confidence': 1.0 - temperature
-            }
+            return await self._build_result(analysis, model_name, temperature, cache_key)
             
         except Exception as e:
             print(f"Error in LLM analysis: {str(e)}")
@@ -74,7 +95,218 @@ class LLMClient:
                 'error': str(e),
                 'analysis': None
             }
+    
+    async def analyze_stocks(self, stocks: List[Dict[str, Any]], ai_settings: Dict[str, Any],
+                             batch_size: int) -> Dict[str, Dict[str, Any]]:
+        """Analyze several stocks, packing up to batch_size of them into each LLM call.
+        
+        Cached analyses from either prompt are served without a call. A batch
+        whose answer cannot be parsed is split in half and retried; single stocks
+        fall back to analyze_stock.
+        
+        Args:
+            stocks (List[Dict[str, Any]]): Stock data to analyze, each with a 'symbol'
+            ai_settings (Dict[str, Any]): AI model configuration from frontend
+            batch_size (int): Maximum number of stocks per LLM call
             
+        Returns:
+            Dict[str, Dict[str, Any]]: LLM analysis results keyed by symbol, in the
+                same shape as analyze_stock returns
+        """
+        model_name = ai_settings.get('model', 'gpt-4o')
+        temperature = ai_settings.get('temperature', 0.7)
+        
+        results = {}
+        pending = []
+        for stock_data in stocks:
+            # A full single-stock analysis serves a batch as well, but not the other way round
+            cached = await self._get_cached(self._cache_key(stock_data, model_name, temperature, batched=True))
+            if cached is None:
+                cached = await self._get_cached(self._cache_key(stock_data, model_name, temperature))
+            if cached is not None:
+                results[stock_data['symbol']] = cached
+            else:
+                pending.append(stock_data)
+        
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        for batch_results in await asyncio.gather(*(self._analyze_batch(batch, ai_settings) for batch in batches)):
+            results.update(batch_results)
+        return results
+    
+    async def analyze_stock_batched(self, stock_data: Dict[str, Any], ai_settings: Dict[str, Any]) -> Dict[str, Any]:
+        """Analyze a stock in one LLM call together with stocks submitted concurrently.
+        
+        Concurrent callers with the same AI settings, e.g. the per-symbol paths of
+        one or several workflow runs, are gathered into batches of up to batch_size
+        stocks. A batch is sent once it is full or batch_linger_seconds after its
+        first stock arrived, and goes through analyze_stocks(). Callers with the
+        same prompt share one analysis; the same symbol with a different prompt,
+        e.g. from another timeframe, gets its own.
+        
+        Args:
+            stock_data (Dict[str, Any]): Stock data to analyze, with a 'symbol'
+            ai_settings (Dict[str, Any]): AI model configuration from frontend
+            
+        Returns:
+            Dict[str, Any]: LLM analysis result, in the same shape as analyze_stock returns
+        """
+        key = json.dumps(ai_settings, sort_keys=True, default=str)
+        prompt = self._prepare_stock_analysis_prompt(stock_data)
+        return await self.batcher.submit(key, prompt, (stock_data, ai_settings))
+    
+    async def _analyze_gathered(self, key: str, batch: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]]
+                                ) -> Dict[str, Dict[str, Any]]:
+        """Analyze a gathered batch keyed by prompt, with every symbol once per analyze_stocks() call."""
+        ai_settings = next(iter(batch.values()))[1]
+        calls: List[Dict[str, Dict[str, Any]]] = []
+        seen: Dict[str, int] = {}
+        for prompt, (stock_data, _) in batch.items():
+            index = seen.get(stock_data['symbol'], 0)
+            seen[stock_data['symbol']] = index + 1
+            if index == len(calls):
+                calls.append({})
+            calls[index][prompt] = stock_data
+        
+        results = await asyncio.gather(*(
+            self.analyze_stocks(list(stocks.values()), ai_settings, self.batch_size) for stocks in calls
+        ))
+        return {
+            prompt: call_results[stock_data['symbol']]
+            for stocks, call_results in zip(calls, results)
+            for prompt, stock_data in stocks.items()
+        }
+    
+    async def _analyze_batch(self, batch: List[Dict[str, Any]], ai_settings: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Analyze one batch of stocks in a single structured prompt."""
+        if len(batch) == 1:
+            return {batch[0]['symbol']: await self.analyze_stock(batch[0], ai_settings)}
+        
+        model_name = ai_settings.get('model', 'gpt-4o')
+        temperature = ai_settings.get('temperature', 0.7)
+        try:
+            async with self.semaphore:
+                response = await self.client.chat.completions.create(
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": SYSTEM_PROMPT
+                        },
+                        {
+                            "role": "user",
+                            "content": self._prepare_batch_analysis_prompt(batch)
+                        }
+                    ],
+                    temperature=temperature,
+                    top_p=1.0,
+                    max_tokens=min(400 * len(batch) + 200, 4000),
+                    model=model_name
+                )
+            analyses = self._parse_batch_analysis(response.choices[0].message.content, batch)
+        except Exception as e:
+            print(f"Error in batched LLM analysis of {len(batch)} stocks: {str(e)}")
+            analyses = None
+        
+        if analyses is None:
+            middle = len(batch) // 2
+            halves = await asyncio.gather(
+                self._analyze_batch(batch[:middle], ai_settings),
+                self._analyze_batch(batch[middle:], ai_settings)
+            )
+            return {**halves[0], **halves[1]}
+        
+        results = {}
+        for stock_data in batch:
+            cache_key = self._cache_key(stock_data, model_name, temperature, batched=True)
+            results[stock_data['symbol']] = await self._build_result(
+                analyses[stock_data['symbol']], model_name, temperature, cache_key
+            )
+        return results
+    
+    def _parse_batch_analysis(self, content: str, batch: List[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+        """Parse the JSON array of a batched answer; None unless every symbol is covered."""
+        start, end = content.find('['), content.rfind(']')
+        if start == -1 or end < start:
+            return None
+        try:
+            entries = json.loads(content[start:end + 1])
+        except json.JSONDecodeError:
+            return None
+        
+        analyses = {}
+        for entry in entries:
+            if isinstance(entry, dict) and isinstance(entry.get('analysis'), str):
+                analyses[str(entry.get('symbol', '')).upper()] = entry['analysis']
+        
+        symbols = [stock_data['symbol'] for stock_data in batch]
+        if any(symbol.upper() not in analyses for symbol in symbols):
+            return None
+        return {symbol: analyses[symbol.upper()] for symbol in symbols}
+    
+    def _cache_key(self, stock_data: Dict[str, Any], model_name: str, temperature: float,
+                   batched: bool = False) -> Optional[str]:
+        """Build the analysis cache key for a stock, or None without a cache.
+        
+        Answers to the batch prompt are keyed by the stock's part of that prompt,
+        so they never match the single-stock prompt's key.
+        """
+        if self.cache is None:
+            return None
+        if self.bucket_numeric:
+            stock_data = self._bucket_stock_data(stock_data)
+        if batched:
+            prompt = BATCH_KEY_PREFIX + self._format_batch_stock(stock_data)
+        else:
+            prompt = self._prepare_stock_analysis_prompt(stock_data)
+        return LLMCache.make_key(model_name, temperature, prompt)
+    
+    async def _get_cached(self, cache_key: Optional[str]) -> Optional[Dict[str, Any]]:
+        if cache_key is None:
+            return None
+        cached = await asyncio.to_thread(self.cache.get, cache_key)
+        return {**cached, 'cache_hit': True} if cached is not None else None
+    
+    async def _build_result(self, analysis: str, model_name: str, temperature: float,
+                            cache_key: Optional[str]) -> Dict[str, Any]:
+        """Structure an analysis for the frontend and store it in the cache."""
+        # Format the response to match the frontend expectations
+        recommendation = {
+            'aiScore': self._calculate_ai_score(analysis),
+            'reason': self._extract_key_insights(analysis)
+        }
+        
+        result = {
+            'status': 'success',
+            'analysis': analysis,
+            'recommendation': recommendation,
+            'model_used': model_name,
+            'confidence': 1.0 - temperature
+        }
+        if cache_key is not None:
+            await asyncio.to_thread(self.cache.set, cache_key, result)
+        return {**result, 'cache_hit': False}
+    
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client and the analysis cache."""
+        await self.client.close()
+        if self.cache is not None:
+            self.cache.close()
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get analysis cache counters."""
+        return self.cache.get_metrics() if self.cache is not None else {}
+    
+    def _bucket_stock_data(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Coarsen numeric prompt fields so small price moves map to the same cache key."""
+        bucketed = dict(stock_data)
+        for field, digits in (('price', 3), ('volume', 2)):
+            value = bucketed.get(field)
+            if isinstance(value, (int, float)) and value:
+                bucketed[field] = round(value, digits - 1 - int(math.floor(math.log10(abs(value)))))
+        change = bucketed.get('change')
+        if isinstance(change, (int, float)):
+            bucketed['change'] = round(change * 2) / 2
+        return bucketed
+    
     def _calculate_ai_score(self, analysis: str) -> int:
         # Implement scoring logic based on sentiment and key metrics
         # Returns a score between 0-100
@@ -122,4 +354,39 @@ Please provide:
 3. Investment Recommendation
 4. Key Factors Influencing the Stock"""
         
-        return prompt
\ No newline at end of file
+        return prompt
+    
+    def _format_batch_stock(self, stock_data: Dict[str, Any]) -> str:
+        """Format one stock's section of the batch prompt."""
+        return f"""Stock Symbol: {stock_data.get('symbol')}
+Current Price: ${stock_data.get('price')}
+Price Change: {stock_data.get('change')}%
+Sector: {stock_data.get('sector')}
+Market Cap: {stock_data.get('marketCap')}
+Trading Volume: {stock_data.get('volume')}"""
+    
+    def _prepare_batch_analysis_prompt(self, batch: List[Dict[str, Any]]) -> str:
+        """Prepare one prompt covering several stocks that asks for a JSON array answer.
+        
+        Args:
+            batch (List[Dict[str, Any]]): Stock data to include in the prompt
+            
+        Returns:
+            str: Formatted prompt for the LLM
+        """
+        stocks = "\n\n".join(self._format_batch_stock(stock_data) for stock_data in batch)
+        
+        prompt = f"""Please analyze each of the following {len(batch)} stocks and provide insights:
+
+{stocks}
+
+For each stock cover, in a single paragraph:
+1. Technical Analysis
+2. Risk Assessment
+3. Investment Recommendation
+4. Key Factors Influencing the Stock
+
+Respond with only a JSON array containing one object per stock, in the same order:
+[{{"symbol": "<ticker>", "analysis": "<your analysis>"}}]"""
+        
+        return prompt
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from typing import Dict, Any, Awaitable, Callable, List, Optional
+from .screening_index import ScreeningIndex
+
+# Overview lists of the day's top movers, in the order they are scanned
+MOVER_LISTS = ('top_gainers', 'top_losers', 'most_actively_traded')
+
+class MarketSnapshotService:
+    """Shared, lazily refreshed view of the market used for stock discovery.
+
+    The market overview is the same for every user within a minute, so
+    requests read the snapshot from memory, and the first request after it
+    is refresh_seconds old fetches a new one; concurrent callers share that
+    single refresh. No provider calls are spent while nobody asks. A
+    snapshot holds the top movers, their performance per sector and the
+    ordered candidate lists discovery picks from.
+
+    If a refresh fails, the previous snapshot is served until it is
+    max_age_seconds old.
+    """
+
+    def __init__(self, config: Dict[str, Any], fetch_overview: Callable[[], Awaitable[Dict[str, Any]]],
+                 screening: Optional[ScreeningIndex] = None):
+        """Initialize the service; nothing is fetched until the first refresh.
+
+        Args:
+            config (Dict[str, Any]): The fetching agent's 'market_snapshot' configuration
+            fetch_overview (Callable[[], Awaitable[Dict[str, Any]]]): Fetches the provider's market overview
+            screening (Optional[ScreeningIndex]): Reference data giving the movers' sectors
+        """
+        self.refresh_seconds = config.get('refresh_seconds', 60)
+        self.max_age_seconds = config.get('max_age_seconds', 300)
+        self.fetch_overview = fetch_overview
+        self.screening = screening
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._refreshing: Optional[asyncio.Task] = None
+        self._stats = {'refreshes': 0, 'failures': 0, 'served': 0}
+
+    async def get(self) -> Dict[str, Any]:
+        """Get the current snapshot, refreshing it first if it is refresh_seconds old.
+
+        Returns:
+            Dict[str, Any]: Snapshot with 'fetched_at', 'movers', 'sector_performance'
+                and 'candidates' by ordering ('default' or 'aggressive')
+        """
+        snapshot = self._snapshot
+        age = time.time() - snapshot['fetched_at'] if snapshot is not None else None
+        if age is None or age > self.refresh_seconds:
+            try:
+                snapshot = await self.refresh()
+            except Exception as e:
+                if age is None or age > self.max_age_seconds:
+                    raise
+                # Keep serving the previous snapshot until it is too old
+                print(f"[MarketSnapshot] Error refreshing the market snapshot: {str(e)}")
+        self._stats['served'] += 1
+        return snapshot
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Fetch the market overview and swap in a new snapshot built from it.
+
+        Returns:
+            Dict[str, Any]: The new snapshot
+        """
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._refresh())
+            self._refreshing.add_done_callback(self._refresh_done)
+        # Callers may be cancelled; the shared refresh keeps going for the others
+        return await asyncio.shield(self._refreshing)
+
+    async def _refresh(self) -> Dict[str, Any]:
+        try:
+            overview = await self.fetch_overview()
+        except Exception:
+            self._stats['failures'] += 1
+            raise
+        movers = {name: overview.get(name) or [] for name in MOVER_LISTS}
+        self._snapshot = {
+            'fetched_at': time.time(),
+            'movers': movers,
+            'sector_performance': self._sector_performance(movers),
+            'candidates': {
+                # Aggressive investors see the day's top gainers first; everyone else
+                # starts from the most actively traded tickers
+                'default': _tickers(movers['most_actively_traded'] + movers['top_gainers']),
+                'aggressive': _tickers(movers['top_gainers'] + movers['most_actively_traded']),
+            },
+        }
+        self._stats['refreshes'] += 1
+        return self._snapshot
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        self._refreshing = None
+        if not task.cancelled():
+            # Retrieve the exception so an unawaited failure is not logged as lost
+            task.exception()
+
+    def _sector_performance(self, movers: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+        """Count the movers per sector and average their change percentage."""
+        entries = {}
+        for name in MOVER_LISTS:
+            for entry in movers[name]:
+                if entry.get('ticker'):
+                    entries.setdefault(entry['ticker'], entry)
+        if self.screening is None or not entries:
+            return {}
+
+        performance: Dict[str, Dict[str, Any]] = {}
+        for entry, sector in zip(entries.values(), self.screening.lookup(list(entries), 'sector')):
+            if sector is None:
+                continue
+            stats = performance.setdefault(sector, {'movers': 0, 'average_change': 0.0})
+            stats['movers'] += 1
+            stats['average_change'] += _change_percentage(entry)
+        for stats in performance.values():
+            stats['average_change'] /= stats['movers']
+        return performance
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the snapshot's age and refresh counters."""
+        snapshot = self._snapshot
+        return {
+            **self._stats,
+            'age_seconds': time.time() - snapshot['fetched_at'] if snapshot is not None else None,
+            'candidates': len(snapshot['candidates']['default']) if snapshot is not None else 0,
+        }
+
+def _tickers(entries: List[Dict[str, Any]]) -> List[str]:
+    """Get the entries' tickers in order, without duplicates."""
+    return list(dict.fromkeys(entry['ticker'] for entry in entries if entry.get('ticker')))
+
+def _change_percentage(entry: Dict[str, Any]) -> float:
+    """Parse an overview entry's change percentage, e.g. '12.5%'."""
+    try:
+        return float(str(entry.get('change_percentage', '0')).rstrip('%'))
+    except ValueError:
+        return 0.0
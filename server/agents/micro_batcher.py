@@ -0,0 +1,86 @@
+import asyncio
+from typing import Dict, Any, Awaitable, Callable, Hashable, List, Set, Tuple
+
+class MicroBatcher:
+    """Gathers items submitted concurrently into batches handled by one call.
+
+    Callers with the same key, e.g. the per-symbol paths of one or several
+    workflow runs, are gathered into batches of up to batch_size named
+    items. A batch is handled once it is full or linger_seconds after its
+    first item arrived, by process(key, items), which returns a result per
+    item name. A batch holds every name once; submitting a name that is
+    already waiting sends the waiting batch and starts the next one, unless
+    share_duplicates is set, for names that identify their item, in which
+    case the caller waits for the same result.
+    """
+
+    def __init__(self, process: Callable[[Hashable, Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                 batch_size: int, linger_seconds: float = 0.01, share_duplicates: bool = False):
+        """Initialize the batcher.
+
+        Args:
+            process (Callable[[Hashable, Dict[str, Any]], Awaitable[Dict[str, Any]]]): Handles
+                a batch's items keyed by name and returns their results keyed by name
+            batch_size (int): Maximum number of items per batch
+            linger_seconds (float): How long a partial batch waits for more items
+            share_duplicates (bool): Whether callers submitting a name that is already
+                waiting share its result
+        """
+        self.process = process
+        self.batch_size = max(1, batch_size)
+        self.linger_seconds = linger_seconds
+        self.share_duplicates = share_duplicates
+        self._pending: Dict[Hashable, Dict[str, Tuple[Any, List[asyncio.Future]]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, key: Hashable, name: str, item: Any) -> Any:
+        """Add an item to the key's pending batch and wait for its result.
+
+        Args:
+            key (Hashable): Items are only batched with items of the same key
+            name (str): The item's name within its batch, e.g. its symbol
+            item (Any): The item to process
+
+        Returns:
+            Any: The item's result, None if process() returned none for it
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.get(key)
+        if batch is not None and name in batch:
+            if self.share_duplicates:
+                batch[name][1].append(future)
+                return await future
+            self._send(key, batch)
+            batch = None
+        if batch is None:
+            batch = self._pending[key] = {}
+            loop.call_later(self.linger_seconds, self._send, key, batch)
+        batch[name] = (item, [future])
+        if len(batch) >= self.batch_size:
+            self._send(key, batch)
+        return await future
+
+    def _send(self, key: Hashable, batch: Dict[str, Tuple[Any, List[asyncio.Future]]]) -> None:
+        """Start handling a gathered batch unless it was already sent."""
+        if self._pending.get(key) is not batch:
+            return
+        del self._pending[key]
+        task = asyncio.ensure_future(self._resolve(key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, key: Hashable, batch: Dict[str, Tuple[Any, List[asyncio.Future]]]) -> None:
+        """Handle a gathered batch and hand every caller its result."""
+        try:
+            results = await self.process(key, {name: item for name, (item, _) in batch.items()})
+        except Exception as e:
+            for _, futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for name, (_, futures) in batch.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(results.get(name))
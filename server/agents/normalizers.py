@@ -0,0 +1,140 @@
+import json
+from operator import itemgetter
+from datetime import datetime, timedelta
+from typing import Dict, Any, Sequence
+from zoneinfo import ZoneInfo
+import numpy as np
+from .columnar import TIMESTAMP_COLUMN, BAR_COLUMNS
+
+# Provider responses are decoded straight into the unified bar schema: one typed
+# array per column in BAR_COLUMNS, int64 epoch-millisecond timestamps and float64
+# prices and volumes, in time order. The json module calls object_hook for every
+# object as soon as it is parsed, innermost first, so each bar is reduced to a
+# tuple of floats the moment it is read, and its dict is freed right away, and
+# each bar list becomes columns right after its last bar. Neither the nested
+# response nor a DataFrame of it is ever held in memory.
+
+# Alpha Vantage intraday timestamps are US/Eastern wall-clock times
+MARKET_TIMEZONE = ZoneInfo('America/New_York')
+
+# Member names of an Alpha Vantage bar, in BAR_COLUMNS order after the timestamp
+ALPHA_VANTAGE_FIELDS = ('1. open', '2. high', '3. low', '4. close', '5. volume')
+
+# Member names of a Polygon aggregate bar, in BAR_COLUMNS order
+POLYGON_FIELDS = ('t', 'o', 'h', 'l', 'c', 'v')
+
+# Pick a bar's members in column order straight from the decoded object
+_alpha_vantage_bar = itemgetter(*ALPHA_VANTAGE_FIELDS)
+_polygon_bar = itemgetter(*POLYGON_FIELDS)
+
+# Member names of a Finnhub quote, in BAR_COLUMNS order; quotes carry no volume
+FINNHUB_QUOTE_FIELDS = ('t', 'o', 'h', 'l', 'c')
+
+def empty_columns() -> Dict[str, np.ndarray]:
+    """Get bar columns holding no bars."""
+    columns = {name: np.empty(0) for name in BAR_COLUMNS}
+    columns[TIMESTAMP_COLUMN] = np.empty(0, dtype=np.int64)
+    return columns
+
+def decode_alpha_vantage(body: bytes) -> Dict[str, Any]:
+    """Decode an Alpha Vantage daily or intraday time series response.
+
+    Args:
+        body (bytes): Raw response body
+
+    Returns:
+        Dict[str, Any]: The response object with its 'Time Series (...)' member
+            replaced by bar columns; throttling notes and errors are kept as-is
+    """
+    return json.loads(body, object_hook=_alpha_vantage_hook)
+
+def decode_polygon(body: bytes) -> Dict[str, Any]:
+    """Decode a Polygon aggregates response.
+
+    Args:
+        body (bytes): Raw response body
+
+    Returns:
+        Dict[str, Any]: The response object with its 'results' member replaced by bar columns
+    """
+    return json.loads(body, object_hook=_polygon_hook)
+
+def alpha_vantage_columns(payload: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Get the bar columns of a decoded Alpha Vantage time series response."""
+    series = next((value for key, value in payload.items() if key.startswith('Time Series')), None)
+    # An empty series decodes to an empty object rather than columns
+    return series if _is_columns(series) else empty_columns()
+
+def polygon_columns(payload: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Get the bar columns of a decoded Polygon aggregates response."""
+    results = payload.get('results')
+    return results if _is_columns(results) else empty_columns()
+
+def finnhub_quote_columns(payload: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Convert a Finnhub quote into a single bar, or no bar for an unknown symbol.
+
+    Finnhub answers unknown symbols with an all-zero quote, so a quote without
+    a timestamp yields no bar.
+    """
+    if not payload.get('t'):
+        return empty_columns()
+    columns = {
+        name: np.array([payload.get(field, np.nan)], dtype=np.float64)
+        for name, field in zip(BAR_COLUMNS, FINNHUB_QUOTE_FIELDS)
+    }
+    columns[TIMESTAMP_COLUMN] = np.array([int(payload['t']) * 1000], dtype=np.int64)
+    columns['volume'] = np.array([np.nan])
+    return columns
+
+def _is_columns(value: Any) -> bool:
+    return isinstance(value, dict) and TIMESTAMP_COLUMN in value
+
+def _alpha_vantage_hook(obj: Dict[str, Any]) -> Any:
+    if ALPHA_VANTAGE_FIELDS[0] in obj:
+        # One bar; numbers arrive as strings
+        return tuple(map(float, _alpha_vantage_bar(obj)))
+    if obj and isinstance(next(iter(obj.values())), tuple):
+        # The time series: stamp -> bar, newest first
+        values = np.array(list(obj.values()), dtype=np.float64)
+        return _sorted_columns(_alpha_vantage_timestamps(list(obj)), values)
+    return obj
+
+def _alpha_vantage_timestamps(stamps: Sequence[str]) -> np.ndarray:
+    """Parse daily dates as UTC midnight and intraday times as US/Eastern wall-clock times."""
+    moments = np.array(stamps, dtype='datetime64[ms]').astype(np.int64)
+    if len(stamps[0]) == 10:
+        return moments
+    # The UTC offset only changes on the hour, so one lookup per distinct hour suffices
+    hours, hour_index = np.unique(moments // 3600000, return_inverse=True)
+    offsets = np.array([
+        MARKET_TIMEZONE.utcoffset(datetime(1970, 1, 1) + timedelta(hours=int(hour))) // timedelta(milliseconds=1)
+        for hour in hours
+    ], dtype=np.int64)
+    return moments - offsets[hour_index]
+
+def _polygon_hook(obj: Dict[str, Any]) -> Any:
+    if 't' in obj and 'c' in obj:
+        # One aggregate bar
+        try:
+            return _polygon_bar(obj)
+        except KeyError:
+            return tuple(obj.get(field, np.nan) for field in POLYGON_FIELDS)
+    results = obj.get('results')
+    if isinstance(results, list):
+        bars = [bar for bar in results if isinstance(bar, tuple)]
+        if bars:
+            values = np.array(bars, dtype=np.float64)
+            obj['results'] = _sorted_columns(values[:, 0].astype(np.int64), values[:, 1:])
+        else:
+            obj['results'] = empty_columns()
+    return obj
+
+def _sorted_columns(timestamps: np.ndarray, values: np.ndarray) -> Dict[str, np.ndarray]:
+    """Build bar columns from timestamps and an n x 5 OHLCV array, in time order."""
+    order = np.argsort(timestamps, kind='stable')
+    columns = {TIMESTAMP_COLUMN: timestamps[order]}
+    # One copy, transposed so every column is contiguous in memory
+    values = np.ascontiguousarray(values[order].T)
+    for index, name in enumerate(BAR_COLUMNS[1:]):
+        columns[name] = values[index]
+    return columns
@@ -0,0 +1,27 @@
+from typing import Dict, Any, Optional
+
+# The API takes risk tolerance on a 1 (lowest) to 5 scale; agents work with named levels
+RISK_LEVELS = {
+    1: 'conservative',
+    2: 'conservative',
+    3: 'moderate',
+    4: 'aggressive',
+    5: 'aggressive',
+}
+
+def risk_level(preferences: Dict[str, Any]) -> Optional[str]:
+    """Get the named risk level of the user's risk tolerance.
+
+    Args:
+        preferences (Dict[str, Any]): User preferences with an optional 'risk_tolerance',
+            either a level name or a number on the 1 to 5 scale
+
+    Returns:
+        Optional[str]: 'conservative', 'moderate' or 'aggressive', or None if not given
+    """
+    tolerance = preferences.get('risk_tolerance')
+    if tolerance in RISK_LEVELS.values():
+        return tolerance
+    if isinstance(tolerance, (int, float)) and not isinstance(tolerance, bool):
+        return RISK_LEVELS[min(max(round(tolerance), 1), 5)]
+    return None
@@ -0,0 +1,363 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+import numpy as np
+from .bar_store import MmapBarStore
+from .columnar import BAR_COLUMNS, rows_to_columns
+
+# Bumped whenever the table layout changes; older cache files are rebuilt
+SCHEMA_VERSION = 3
+
+class PriceCache:
+    """Persistent SQLite cache for market data provider responses.
+
+    Entries are keyed by provider, symbol and timeframe. Each entry gets an
+    expiry that fits its kind of data: quotes and overviews live for a few
+    seconds, daily bars until the next end-of-day update. The cache is
+    bounded by entry count and size, evicting the least recently used
+    entries first.
+
+    Price history is also kept as individual bars per provider, symbol and
+    interval, so only bars newer than the last stored one need fetching. The
+    bars live in the SQLite file or, with the 'mmap' bar store backend, in a
+    memory-mapped columnar store; the series metadata always stays here.
+    Stored bars are bounded by max_bars, evicting whole series, least
+    recently loaded first.
+
+    Methods are blocking; call them from a worker thread inside async code.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """Initialize the cache and create its table if needed.
+
+        Args:
+            config (Dict[str, Any]): The data_fetching 'cache' configuration
+        """
+        self.path = config['path']
+        self.max_entries = config.get('max_entries', 5000)
+        self.max_bytes = config.get('max_bytes', 512 * 1024 * 1024)
+        self.max_bars = config.get('max_bars', 10_000_000)
+        self.ttl_seconds = config.get('ttl_seconds', {})
+        self.timezone = ZoneInfo(config.get('timezone', 'America/New_York'))
+        self.daily_expiry = datetime.strptime(config.get('daily_expiry', '16:30'), '%H:%M').time()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._evictions = 0
+        self._series_evictions = 0
+        bar_store_config = config.get('bar_store', {})
+        self.bar_store = MmapBarStore(bar_store_config) if bar_store_config.get('backend') == 'mmap' else None
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        if self._conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            for table in ('responses', 'bars', 'bar_series'):
+                self._conn.execute(f'DROP TABLE IF EXISTS {table}')
+            self._conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS responses (
+                provider TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                timeframe TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (provider, symbol, timeframe)
+            )'''
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)')
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS bars (
+                provider TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume REAL,
+                PRIMARY KEY (provider, symbol, interval, ts)
+            ) WITHOUT ROWID'''
+        )
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS bar_series (
+                provider TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                covered_from INTEGER NOT NULL,
+                last_ts INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                bars INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (provider, symbol, interval)
+            )'''
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS bar_series_lru ON bar_series (last_access)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        backend = bar_store_config.get('backend', 'sqlite')
+        stored = self._conn.execute("SELECT value FROM settings WHERE name = 'bar_backend'").fetchone()
+        if stored is not None and stored[0] != backend:
+            # Series metadata describes bars held by the other backend; start the series over
+            self._conn.execute('DELETE FROM bar_series')
+            self._conn.execute('DELETE FROM bars')
+        self._conn.execute("INSERT OR REPLACE INTO settings VALUES ('bar_backend', ?)", (backend,))
+        self._conn.commit()
+
+    def get(self, provider: str, symbol: str, timeframe: str) -> Optional[Any]:
+        """Get a cached response if present and not expired.
+
+        Args:
+            provider (str): Provider name
+            symbol (str): Ticker symbol
+            timeframe (str): Timeframe the response covers
+
+        Returns:
+            Optional[Any]: Decoded response, or None on a miss
+        """
+        now = time.time()
+        stats = self._get_stats(provider)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT payload, expires_at FROM responses WHERE provider = ? AND symbol = ? AND timeframe = ?',
+                (provider, symbol, timeframe)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                stats['misses'] += 1
+                if row is not None:
+                    stats['expired'] += 1
+                return None
+            self._conn.execute(
+                'UPDATE responses SET last_access = ? WHERE provider = ? AND symbol = ? AND timeframe = ?',
+                (now, provider, symbol, timeframe)
+            )
+            self._conn.commit()
+            stats['hits'] += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, provider: str, symbol: str, timeframe: str, kind: str, payload: Any) -> None:
+        """Store a response and evict least recently used entries over the limits.
+
+        Args:
+            provider (str): Provider name
+            symbol (str): Ticker symbol
+            timeframe (str): Timeframe the response covers
+            kind (str): Data kind that selects the TTL ('quote', 'overview', 'intraday' or 'daily')
+            payload (Any): JSON-serializable response
+        """
+        now = time.time()
+        blob = zlib.compress(json.dumps(payload).encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (provider, symbol, timeframe, kind, blob, len(blob), self._expires_at(kind, now), now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def get_series_state(self, provider: str, symbol: str, interval: str) -> Tuple[Optional[int], Optional[int], bool]:
+        """Get how far back and forward a stored series reaches and whether it is still fresh.
+
+        Args:
+            provider (str): Provider name
+            symbol (str): Ticker symbol
+            interval (str): Bar interval ('5minute', 'hour' or 'day')
+
+        Returns:
+            Tuple[Optional[int], Optional[int], bool]: Epoch-millisecond time from
+                which the series is complete, time of the last stored bar (both None
+                if nothing is stored) and whether a fetch can be skipped
+        """
+        stats = self._get_stats(provider)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT covered_from, last_ts, expires_at FROM bar_series WHERE provider = ? AND symbol = ? AND interval = ?',
+                (provider, symbol, interval)
+            ).fetchone()
+            if row is None:
+                stats['misses'] += 1
+                return None, None, False
+            if row[2] <= time.time():
+                stats['misses'] += 1
+                stats['expired'] += 1
+                return row[0], row[1], False
+            stats['hits'] += 1
+        return row[0], row[1], True
+
+    def append_bars(self, provider: str, symbol: str, interval: str, bars: Dict[str, np.ndarray],
+                    kind: str = 'daily', covered_from: Optional[int] = None) -> int:
+        """Add newly fetched bars to the stored series and evict series over max_bars.
+
+        Only bars outside the stored range are written: newer ones are appended
+        and, when backfilling, older ones are prepended. The last stored bar is
+        replaced as well, since it may have been a partial bar when fetched.
+
+        Args:
+            provider (str): Provider name
+            symbol (str): Ticker symbol
+            interval (str): Bar interval
+            bars (Dict[str, np.ndarray]): timestamp, open, high, low, close and volume columns
+            kind (str): Data kind that selects the series TTL
+            covered_from (Optional[int]): Time from which the fetched bars are complete,
+                when they were fetched for a whole window rather than as a delta
+
+        Returns:
+            int: Number of bars written
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT covered_from, last_ts FROM bar_series WHERE provider = ? AND symbol = ? AND interval = ?',
+                (provider, symbol, interval)
+            ).fetchone()
+            stored_from, last_ts = row if row is not None else (None, None)
+            timestamps = bars['timestamp']
+            if last_ts is not None:
+                keep = (timestamps >= last_ts) | (timestamps < stored_from)
+                bars = {name: values[keep] for name, values in bars.items()}
+                timestamps = bars['timestamp']
+            count = len(timestamps)
+            if self.bar_store is not None:
+                stored = self.bar_store.append(provider, symbol, interval, bars)
+            else:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(provider, symbol, interval, *bar) for bar in zip(*(bars[name].tolist() for name in BAR_COLUMNS))]
+                )
+                stored = self._conn.execute(
+                    'SELECT COUNT(*) FROM bars WHERE provider = ? AND symbol = ? AND interval = ?',
+                    (provider, symbol, interval)
+                ).fetchone()[0]
+            if count:
+                last_ts = max(last_ts or 0, int(timestamps.max()))
+            if covered_from is None:
+                covered_from = int(timestamps.min()) if count else last_ts
+            if stored_from is not None:
+                covered_from = min(stored_from, covered_from)
+            if last_ts is not None:
+                now = time.time()
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO bar_series VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (provider, symbol, interval, covered_from, last_ts, self._expires_at(kind, now), stored, now)
+                )
+                self._evict_series()
+            self._conn.commit()
+        return count
+
+    def load_bars(self, provider: str, symbol: str, interval: str,
+                  start_ts: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Load stored bars in time order as column arrays.
+
+        Args:
+            provider (str): Provider name
+            symbol (str): Ticker symbol
+            interval (str): Bar interval
+            start_ts (Optional[int]): Only return bars at or after this epoch-millisecond time
+
+        Returns:
+            Dict[str, np.ndarray]: timestamp, open, high, low, close and volume columns;
+                read-only views of the mapped files with the 'mmap' backend
+        """
+        with self._lock:
+            self._conn.execute(
+                'UPDATE bar_series SET last_access = ? WHERE provider = ? AND symbol = ? AND interval = ?',
+                (time.time(), provider, symbol, interval)
+            )
+            self._conn.commit()
+            if self.bar_store is not None:
+                return self.bar_store.load(provider, symbol, interval, start_ts)
+            rows = self._conn.execute(
+                '''SELECT ts, open, high, low, close, volume FROM bars
+                   WHERE provider = ? AND symbol = ? AND interval = ? AND ts >= ?
+                   ORDER BY ts''',
+                (provider, symbol, interval, start_ts or 0)
+            ).fetchall()
+        return rows_to_columns(rows)
+
+    def _expires_at(self, kind: str, now: float) -> float:
+        """Compute the expiry timestamp for a kind of data."""
+        if kind == 'daily':
+            # Daily bars only change once the trading day has been settled
+            local_now = datetime.fromtimestamp(now, self.timezone)
+            expiry = datetime.combine(local_now.date(), self.daily_expiry, tzinfo=self.timezone)
+            if expiry <= local_now:
+                expiry += timedelta(days=1)
+            return expiry.timestamp()
+        return now + self.ttl_seconds.get(kind, 60)
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until both size limits hold."""
+        count, total = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        rows = self._conn.execute('SELECT rowid, size FROM responses ORDER BY last_access').fetchall()
+        evicted = []
+        for rowid, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            evicted.append((rowid,))
+            count -= 1
+            total -= size
+        self._conn.executemany('DELETE FROM responses WHERE rowid = ?', evicted)
+        self._evictions += len(evicted)
+
+    def _evict_series(self) -> None:
+        """Delete least recently loaded bar series until the stored bars fit max_bars."""
+        total = self._conn.execute('SELECT COALESCE(SUM(bars), 0) FROM bar_series').fetchone()[0]
+        if total <= self.max_bars:
+            return
+        rows = self._conn.execute(
+            'SELECT provider, symbol, interval, bars FROM bar_series ORDER BY last_access'
+        ).fetchall()
+        for provider, symbol, interval, bars in rows:
+            if total <= self.max_bars:
+                break
+            key = (provider, symbol, interval)
+            self._conn.execute('DELETE FROM bar_series WHERE provider = ? AND symbol = ? AND interval = ?', key)
+            if self.bar_store is not None:
+                self.bar_store.delete(provider, symbol, interval)
+            else:
+                self._conn.execute('DELETE FROM bars WHERE provider = ? AND symbol = ? AND interval = ?', key)
+            total -= bars
+            self._series_evictions += 1
+
+    def _get_stats(self, provider: str) -> Dict[str, int]:
+        if provider not in self._stats:
+            self._stats[provider] = {'hits': 0, 'misses': 0, 'expired': 0}
+        return self._stats[provider]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get hit/miss counters per provider and overall cache size."""
+        with self._lock:
+            count, total = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses'
+            ).fetchone()
+            series, bars = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(bars), 0) FROM bar_series'
+            ).fetchone()
+        metrics = {
+            'providers': {provider: dict(stats) for provider, stats in self._stats.items()},
+            'entries': count,
+            'bytes': total,
+            'evictions': self._evictions,
+            'series': series,
+            'stored_bars': bars,
+            'series_evictions': self._series_evictions
+        }
+        if self.bar_store is not None:
+            metrics['bar_store'] = self.bar_store.get_metrics()
+        return metrics
+
+    def close(self) -> None:
+        """Close the database connection and the bar store."""
+        with self._lock:
+            self._conn.close()
+        if self.bar_store is not None:
+            self.bar_store.close()
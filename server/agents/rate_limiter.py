@@ -0,0 +1,152 @@
+import asyncio
+import time
+from typing import Dict, Any, Optional
+
+class ThrottledError(Exception):
+    """Raised when a provider rejects a request for exceeding its quota."""
+
+class TokenBucket:
+    """Token bucket refilled continuously at a fixed rate."""
+
+    def __init__(self, requests: float, per_seconds: float, burst: Optional[float] = None):
+        """Initialize the bucket.
+
+        Args:
+            requests (float): Requests allowed per window
+            per_seconds (float): Window length in seconds
+            burst (Optional[float]): Bucket capacity, defaults to the per-window allowance
+        """
+        self.rate = requests / per_seconds
+        self.capacity = burst if burst is not None else requests
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> float:
+        """Take one token if available.
+
+        Returns:
+            float: 0 when a token was taken, otherwise seconds until one is available
+        """
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def drain(self, penalty_seconds: float = 0.0) -> None:
+        """Empty the bucket, optionally pushing the next token further out."""
+        self._refill()
+        self.tokens = -penalty_seconds * self.rate
+
+class ProviderScheduler:
+    """Queues provider requests so each provider stays under its rate limit.
+
+    Every provider has its own token bucket and a FIFO queue in front of it.
+    One scheduler is shared by all concurrent analyses in the process, so the
+    quota is respected globally rather than per request.
+    """
+
+    def __init__(self, rate_limits: Dict[str, Dict[str, float]]):
+        """Initialize the scheduler.
+
+        Args:
+            rate_limits (Dict[str, Dict[str, float]]): Per-provider 'requests',
+                'per_seconds' and optional 'burst' settings
+        """
+        self.buckets = {
+            provider: TokenBucket(limit['requests'], limit['per_seconds'], limit.get('burst'))
+            for provider, limit in rate_limits.items()
+        }
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._stats: Dict[str, Dict[str, float]] = {
+            provider: {
+                'queue_depth': 0,
+                'max_queue_depth': 0,
+                'requests': 0,
+                'throttled': 0,
+                'total_wait': 0.0,
+                'max_wait': 0.0
+            }
+            for provider in self.buckets
+        }
+
+    async def acquire(self, provider: str) -> None:
+        """Wait until a request to the provider may be sent.
+
+        Args:
+            provider (str): Provider name; providers without a limit pass straight through
+        """
+        bucket = self.buckets.get(provider)
+        if bucket is None:
+            return
+
+        stats = self._stats[provider]
+        lock = self._locks.setdefault(provider, asyncio.Lock())
+        stats['queue_depth'] += 1
+        stats['max_queue_depth'] = max(stats['max_queue_depth'], stats['queue_depth'])
+        started = time.monotonic()
+        try:
+            # asyncio.Lock wakes waiters in FIFO order, which keeps the queue fair
+            async with lock:
+                wait = bucket.try_acquire()
+                while wait > 0:
+                    await asyncio.sleep(wait)
+                    wait = bucket.try_acquire()
+        finally:
+            stats['queue_depth'] -= 1
+
+        waited = time.monotonic() - started
+        stats['requests'] += 1
+        stats['total_wait'] += waited
+        stats['max_wait'] = max(stats['max_wait'], waited)
+
+    def try_acquire_now(self, provider: str) -> bool:
+        """Take a token only if one is free right now and nobody is queued for it.
+
+        Args:
+            provider (str): Provider name
+
+        Returns:
+            bool: Whether the request may be sent immediately
+        """
+        bucket = self.buckets.get(provider)
+        if bucket is None:
+            return True
+        stats = self._stats[provider]
+        if stats['queue_depth'] or bucket.try_acquire() > 0:
+            return False
+        stats['requests'] += 1
+        return True
+
+    def record_throttle(self, provider: str, retry_after: float = 0.0) -> None:
+        """Back off after the provider reported that its quota was exceeded.
+
+        Args:
+            provider (str): Provider that throttled the request
+            retry_after (float): Seconds the provider asked us to wait, if any
+        """
+        bucket = self.buckets.get(provider)
+        if bucket is None:
+            return
+        bucket.drain(retry_after)
+        self._stats[provider]['throttled'] += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get queue depth and wait-time metrics for every provider."""
+        metrics = {}
+        for provider, stats in self._stats.items():
+            requests = stats['requests']
+            metrics[provider] = {
+                'queue_depth': stats['queue_depth'],
+                'max_queue_depth': stats['max_queue_depth'],
+                'requests': requests,
+                'throttled': stats['throttled'],
+                'avg_wait_seconds': stats['total_wait'] / requests if requests else 0.0,
+                'max_wait_seconds': stats['max_wait']
+            }
+        return metrics
@@ -0,0 +1,123 @@
+from typing import Dict, Any, List, Sequence
+import numpy as np
+
+# Stocks are ranked on a symbols x factors matrix of factor scores in [0, 1];
+# a weight scheme turns it into composite scores with one matrix product.
+RANKING_FACTORS = ('performance', 'risk_metrics', 'market_sentiment', 'technical_indicators')
+
+# Share of an LLM-analyzed stock's final score taken from the LLM's confidence
+LLM_WEIGHT = 0.3
+
+# LLM confidence assumed when the analysis does not report one
+DEFAULT_LLM_CONFIDENCE = 0.5
+
+# Score of each moving average trend towards the performance factor
+MA_TREND_SCORES = {'strong_uptrend': 1.0, 'potential_reversal_up': 0.5}
+
+# RSI range counted as healthy market sentiment
+RSI_SENTIMENT_RANGE = (40, 60)
+
+def factor_matrix(analysis_results: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Score every stock on every ranking factor.
+
+    Args:
+        analysis_results (Sequence[Dict[str, Any]]): Each stock's analysis metrics
+
+    Returns:
+        np.ndarray: Float64 matrix of len(analysis_results) x len(RANKING_FACTORS)
+            factor scores, columns in RANKING_FACTORS order
+    """
+    fields = _metric_fields(analysis_results)
+    (momentum_positive, ma_score, ma_up, volatility, volume_increasing,
+     rsi, rsi_not_overbought, metric_count) = fields.T
+
+    matrix = np.empty((len(analysis_results), len(RANKING_FACTORS)))
+    matrix[:, 0] = (momentum_positive + ma_score) / 2.0
+    # Lower volatility scores higher; unknown volatility scores as the riskiest
+    with np.errstate(invalid='ignore'):
+        matrix[:, 1] = np.where(np.isnan(volatility), 0.0, 1.0 - np.minimum(volatility / 100, 1.0))
+        low, high = RSI_SENTIMENT_RANGE
+        matrix[:, 2] = 0.5 * volume_increasing + 0.5 * ((rsi >= low) & (rsi <= high))
+    # Every metric of the stock counts equally towards the technical score
+    matrix[:, 3] = (ma_up + rsi_not_overbought) / np.maximum(metric_count, 1)
+    return matrix
+
+def score_stocks(analysis_results: Sequence[Dict[str, Any]], ranking_factors: Sequence[str],
+                 weight_scheme: Dict[str, float]) -> np.ndarray:
+    """Calculate composite scores from the weighted ranking factors and LLM confidence.
+
+    Args:
+        analysis_results (Sequence[Dict[str, Any]]): Each stock's analysis metrics
+        ranking_factors (Sequence[str]): Factors to rank on, from RANKING_FACTORS
+        weight_scheme (Dict[str, float]): Weight of each ranking factor
+
+    Returns:
+        np.ndarray: Float64 composite score of every stock
+    """
+    if not len(analysis_results):
+        return np.empty(0)
+    weights = np.array([
+        weight_scheme[factor] if factor in ranking_factors else 0.0 for factor in RANKING_FACTORS
+    ])
+    scores = factor_matrix(analysis_results) @ weights
+
+    # Blend traditional and AI analysis where the stock has an LLM analysis
+    llm_confidence = np.array([
+        metrics['llm_analysis'].get('confidence_score', DEFAULT_LLM_CONFIDENCE)
+        if 'llm_analysis' in metrics else np.nan
+        for metrics in analysis_results
+    ], dtype=np.float64)
+    analyzed = ~np.isnan(llm_confidence)
+    scores[analyzed] = scores[analyzed] * (1 - LLM_WEIGHT) + llm_confidence[analyzed] * LLM_WEIGHT
+    return scores
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Get the indices of the k highest scores, highest first.
+
+    Uses partial selection, so only the selected scores are sorted. Equal
+    scores keep their input order and NaN scores rank last, as a stable
+    descending sort would order them.
+
+    Args:
+        scores (np.ndarray): Scores to rank
+        k (int): Number of indices to return
+
+    Returns:
+        np.ndarray: Indices into scores of the top min(k, len(scores)) scores
+    """
+    ranked = np.nan_to_num(np.asarray(scores, dtype=np.float64), nan=-np.inf)
+    count = len(ranked)
+    k = max(0, min(k, count))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    if k == count:
+        candidates = np.arange(count)
+    else:
+        kth = np.partition(ranked, count - k)[count - k]
+        above = np.flatnonzero(ranked > kth)
+        tied = np.flatnonzero(ranked == kth)[:k - len(above)]
+        candidates = np.concatenate([above, tied])
+    return candidates[np.lexsort((candidates, -ranked[candidates]))]
+
+def _metric_fields(analysis_results: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Pull the fields the factor scores need out of every stock's metrics, one row per stock."""
+    rows: List[tuple] = []
+    for metrics in analysis_results:
+        momentum = metrics.get('momentum') or {}
+        moving_averages = metrics.get('moving_averages')
+        volatility = (metrics.get('volatility') or {}).get('volatility')
+        volume = metrics.get('volume') or {}
+        relative_strength = metrics.get('relative_strength')
+        rsi = relative_strength.get('rsi') if relative_strength is not None else None
+        trend = moving_averages.get('trend') if moving_averages is not None else None
+        rows.append((
+            momentum.get('momentum_trend') == 'positive',
+            MA_TREND_SCORES.get(trend, 0.0),
+            trend in MA_TREND_SCORES,
+            np.nan if volatility is None else volatility,
+            volume.get('volume_trend') == 'increasing',
+            np.nan if rsi is None else rsi,
+            relative_strength is not None and relative_strength.get('rsi_trend') != 'overbought',
+            len(metrics),
+        ))
+    return np.array(rows, dtype=np.float64).reshape(len(rows), 8)
@@ -0,0 +1,166 @@
+import asyncio
+import csv
+import os
+from typing import Dict, Any, List, Optional, Sequence
+import numpy as np
+
+# Preference keys and the index column each one filters on. A filter matches
+# a symbol when its column holds any of the preferred values.
+PREFERENCE_FILTERS = {
+    'sectors': 'sector',
+    'market_cap': 'market_cap',
+}
+
+class ScreeningIndex:
+    """Local reference data of symbol -> sector, market-cap bucket and dividend flag.
+
+    The index is read from a CSV file with the columns symbol, sector,
+    market_cap and dividend; lines starting with '#' are comments. Symbols
+    are kept in a sorted array and every sector, market-cap bucket and the
+    dividend flag gets a bitmap over it, so screening a preference set is a
+    few bitwise operations and a binary search per candidate, with no
+    provider call.
+
+    The file is reloaded when it changes, checked every refresh_seconds by
+    refresh_periodically(). A reload builds a new snapshot and swaps it in,
+    so concurrent readers always see a complete index.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """Initialize the index and load the reference file if it exists.
+
+        Args:
+            config (Dict[str, Any]): The fetching agent's 'screening' configuration
+        """
+        self.path = config['path']
+        self.refresh_seconds = config.get('refresh_seconds', 3600)
+        self.include_unknown = config.get('include_unknown', False)
+        self._snapshot = _Snapshot([])
+        self._mtime: Optional[float] = None
+        self.reload()
+
+    def reload(self) -> bool:
+        """Load the reference file if it changed since the last load.
+
+        Returns:
+            bool: Whether a new index was loaded
+        """
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            if self._mtime is None:
+                print(f"[ScreeningIndex] No reference data at {self.path}; symbols are not screened")
+            return False
+        if mtime == self._mtime:
+            return False
+
+        with open(self.path, newline='') as handle:
+            lines = (line for line in handle if line.strip() and not line.startswith('#'))
+            rows = list(csv.DictReader(lines))
+        self._snapshot = _Snapshot(rows)
+        self._mtime = mtime
+        print(f"[ScreeningIndex] Loaded {len(self._snapshot.symbols)} symbols from {self.path}")
+        return True
+
+    async def refresh_periodically(self) -> None:
+        """Reload the reference file every refresh_seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await asyncio.to_thread(self.reload)
+            except Exception as e:
+                # Keep serving the previous index
+                print(f"[ScreeningIndex] Error reloading {self.path}: {str(e)}")
+
+    def screen(self, candidates: Sequence[str], preferences: Dict[str, Any], limit: int) -> List[str]:
+        """Keep the candidates that can meet the preferences.
+
+        Candidates missing from the index are kept only if include_unknown is
+        set. No symbols are added; fewer than limit may qualify.
+
+        Args:
+            candidates (Sequence[str]): Symbols in order of preference
+            preferences (Dict[str, Any]): User preferences with optional 'sectors',
+                'market_cap' and 'dividend_preference'
+            limit (int): Maximum number of symbols to return
+
+        Returns:
+            List[str]: Up to limit qualifying candidates, in their given order
+        """
+        snapshot = self._snapshot
+        mask = snapshot.mask(preferences)
+        if mask is None or not len(snapshot.symbols):
+            return list(candidates)[:limit]
+
+        candidates = list(dict.fromkeys(candidates))
+        positions = np.searchsorted(snapshot.symbols, candidates)
+        positions = np.minimum(positions, len(snapshot.symbols) - 1)
+        known = snapshot.symbols[positions] == np.array(candidates, dtype=str)
+        qualifies = np.where(known, mask[positions], self.include_unknown)
+        return [symbol for symbol, keep in zip(candidates, qualifies.tolist()) if keep][:limit]
+
+    def lookup(self, symbols: Sequence[str], column: str) -> List[Optional[str]]:
+        """Get a reference column's value for every symbol, None for unknown symbols.
+
+        Args:
+            symbols (Sequence[str]): Ticker symbols
+            column (str): 'sector' or 'market_cap'
+
+        Returns:
+            List[Optional[str]]: The symbols' values, in the given order
+        """
+        snapshot = self._snapshot
+        if not len(snapshot.symbols) or not len(symbols):
+            return [None] * len(symbols)
+        positions = np.minimum(np.searchsorted(snapshot.symbols, symbols), len(snapshot.symbols) - 1)
+        known = snapshot.symbols[positions] == np.array(symbols, dtype=str)
+        values = snapshot.values[column][positions]
+        return [(value or None) if found else None for value, found in zip(values.tolist(), known.tolist())]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the number of indexed symbols and the values of each filter column."""
+        snapshot = self._snapshot
+        return {
+            'symbols': len(snapshot.symbols),
+            'path': self.path,
+            'values': {column: sorted(bitmaps) for column, bitmaps in snapshot.bitmaps.items()},
+        }
+
+class _Snapshot:
+    """An immutable, fully built index of one version of the reference file."""
+
+    def __init__(self, rows: List[Dict[str, str]]):
+        rows = [row for row in rows if (row.get('symbol') or '').strip()]
+        symbols = np.array([row['symbol'].strip().upper() for row in rows], dtype=str)
+        order = np.argsort(symbols, kind='stable')
+        self.symbols = symbols[order]
+        self.values: Dict[str, np.ndarray] = {}
+        self.bitmaps: Dict[str, Dict[str, np.ndarray]] = {}
+        for column in PREFERENCE_FILTERS.values():
+            values = np.array([(row.get(column) or '').strip().lower() for row in rows], dtype=str)[order]
+            self.values[column] = values
+            self.bitmaps[column] = {
+                value: np.packbits(values == value) for value in np.unique(values).tolist() if value
+            }
+        dividend = np.array([(row.get('dividend') or '').strip().lower() in ('1', 'true', 'yes')
+                             for row in rows], dtype=bool)[order]
+        self.dividend = np.packbits(dividend)
+
+    def mask(self, preferences: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Get a boolean mask over symbols of those meeting the preferences, or None if nothing is filtered."""
+        bits = None
+        for key, column in PREFERENCE_FILTERS.items():
+            wanted = [str(value).lower() for value in preferences.get(key) or []]
+            # Asking for every known value filters nothing
+            if not wanted or set(self.bitmaps[column]) <= set(wanted):
+                continue
+            matches = np.zeros_like(self.dividend)
+            for value in wanted:
+                if value in self.bitmaps[column]:
+                    matches |= self.bitmaps[column][value]
+            bits = matches if bits is None else bits & matches
+        if preferences.get('dividend_preference'):
+            bits = self.dividend if bits is None else bits & self.dividend
+        if bits is None:
+            return None
+        return np.unpackbits(bits, count=len(self.symbols)).astype(bool)
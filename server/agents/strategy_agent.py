@@ -1,8 +1,31 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 from langchain.schema import BaseMessage
 from langchain_core.runnables import RunnableConfig
-import pandas as pd
+import numpy as np
 from .base_agent import BaseAgent
+from .preferences import risk_level
+from .scoring import score_stocks, top_k
+
+# Strategy inputs that are not a stock's analysis results
+NON_STOCK_INPUTS = ('preferences',)
+
+# Ranking factors and their weights used instead of the configured ones, per risk level
+RISK_STRATEGIES = {
+    'conservative': {
+        'risk_metrics': 0.7,
+        'technical_indicators': 0.3
+    },
+    'moderate': {
+        'performance': 0.4,
+        'risk_metrics': 0.3,
+        'technical_indicators': 0.3
+    },
+    'aggressive': {
+        'performance': 0.5,
+        'market_sentiment': 0.3,
+        'technical_indicators': 0.2
+    },
+}
 
 class StrategyAgent(BaseAgent):
     """Agent responsible for applying investment strategies and ranking stocks."""
@@ -25,160 +48,59 @@ class StrategyAgent(BaseAgent):
         try:
             preferences = inputs.get('preferences', {})
             
-            # Adjust ranking factors based on user preferences
-            if preferences.get('risk_tolerance'):
-                risk_level = preferences['risk_tolerance']
-                if risk_level == 'conservative':
-                    self.ranking_factors = ['risk_metrics', 'technical_indicators']
-                    self.weight_scheme = {
-                        'risk_metrics': 0.7,
-                        'technical_indicators': 0.3
-                    }
-                elif risk_level == 'moderate':
-                    self.ranking_factors = ['performance', 'risk_metrics', 'technical_indicators']
-                    self.weight_scheme = {
-                        'performance': 0.4,
-                        'risk_metrics': 0.3,
-                        'technical_indicators': 0.3
-                    }
-                elif risk_level == 'aggressive':
-                    self.ranking_factors = ['performance', 'market_sentiment', 'technical_indicators']
-                    self.weight_scheme = {
-                        'performance': 0.5,
-                        'market_sentiment': 0.3,
-                        'technical_indicators': 0.2
-                    }
+            ranking_factors, weight_scheme = self._strategy_for(preferences)
             
-            # Convert analysis results to a format suitable for ranking
-            stock_scores = self._calculate_stock_scores(inputs)
+            # Score all stocks at once on a symbols x factors matrix
+            symbols, scores = self._calculate_stock_scores(inputs, ranking_factors, weight_scheme)
             
-            # Rank stocks based on composite scores
-            ranked_stocks = self._rank_stocks(stock_scores)
-            
-            # Adjust number of top stocks based on preferences
+            # Rank only as many stocks as the preferences ask for
             limit = preferences.get('max_recommendations', 5)
-            top_stocks = self._get_top_stocks(ranked_stocks, limit=limit)
+            top_stocks = self._get_top_stocks(symbols, scores, limit=limit)
             
             return {
                 'top_stocks': top_stocks,
-                'ranking_metrics': self._get_ranking_metrics(top_stocks)
+                'ranking_metrics': self._get_ranking_metrics(top_stocks, ranking_factors)
             }
         except Exception as e:
             self.update_state('error_strategy', str(e))
             return {}
     
-    def _calculate_stock_scores(self, analysis_results: Dict[str, Any]) -> Dict[str, float]:
-        """Calculate composite scores for each stock based on analysis metrics and LLM insights."""
-        stock_scores = {}
+    def score_stock(self, analysis: Dict[str, Any], preferences: Dict[str, Any]) -> float:
+        """Score a single stock the way run() ranks it, e.g. to report it before the ranking.
         
-        for stock, metrics in analysis_results.items():
-            score = 0.0
-            
-            # Performance score (based on momentum and moving averages)
-            if 'performance' in self.ranking_factors:
-                perf_score = self._calculate_performance_score(metrics)
-                score += perf_score * self.weight_scheme['performance']
-            
-            # Risk metrics score (based on volatility)
-            if 'risk_metrics' in self.ranking_factors:
-                risk_score = self._calculate_risk_score(metrics)
-                score += risk_score * self.weight_scheme['risk_metrics']
-            
-            # Market sentiment score (based on volume and RSI)
-            if 'market_sentiment' in self.ranking_factors:
-                sentiment_score = self._calculate_sentiment_score(metrics)
-                score += sentiment_score * self.weight_scheme['market_sentiment']
-            
-            # Technical indicators score
-            if 'technical_indicators' in self.ranking_factors:
-                tech_score = self._calculate_technical_score(metrics)
-                score += tech_score * self.weight_scheme['technical_indicators']
-            
-            # Incorporate LLM analysis score
-            if 'llm_analysis' in metrics:
-                llm_score = metrics['llm_analysis'].get('confidence_score', 0.5)
-                score = score * 0.7 + llm_score * 0.3  # Blend traditional and AI analysis
+        Args:
+            analysis (Dict[str, Any]): The stock's analysis results from AnalysisAgent
+            preferences (Dict[str, Any]): User preferences
             
-            stock_scores[stock] = score
-        
-        return stock_scores
-    
-    def _calculate_performance_score(self, metrics: Dict[str, Any]) -> float:
-        """Calculate performance score based on momentum and moving averages."""
-        score = 0.0
-        
-        if 'momentum' in metrics:
-            momentum_data = metrics['momentum']
-            score += 1.0 if momentum_data.get('momentum_trend') == 'positive' else 0.0
-        
-        if 'moving_averages' in metrics:
-            ma_data = metrics['moving_averages']
-            trend = ma_data.get('trend', '')
-            if trend == 'strong_uptrend':
-                score += 1.0
-            elif trend == 'potential_reversal_up':
-                score += 0.5
-        
-        return score / 2.0  # Normalize to [0,1]
-    
-    def _calculate_risk_score(self, metrics: Dict[str, Any]) -> float:
-        """Calculate risk score based on volatility metrics."""
-        score = 0.0
-        
-        if 'volatility' in metrics:
-            vol_data = metrics['volatility']
-            volatility = vol_data.get('volatility', float('inf'))
-            # Lower volatility = higher score
-            score = 1.0 - min(volatility / 100, 1.0)  # Normalize high volatility
-        
-        return score
-    
-    def _calculate_sentiment_score(self, metrics: Dict[str, Any]) -> float:
-        """Calculate market sentiment score based on volume and RSI."""
-        score = 0.0
-        
-        if 'volume' in metrics:
-            volume_data = metrics['volume']
-            if volume_data.get('volume_trend') == 'increasing':
-                score += 0.5
-        
-        if 'relative_strength' in metrics:
-            rsi_data = metrics['relative_strength']
-            rsi = rsi_data.get('rsi', 50)
-            # Optimal RSI range (40-60)
-            if 40 <= rsi <= 60:
-                score += 0.5
-        
-        return score
+        Returns:
+            float: The stock's composite score
+        """
+        ranking_factors, weight_scheme = self._strategy_for(preferences)
+        return float(score_stocks([analysis], ranking_factors, weight_scheme)[0])
     
-    def _calculate_technical_score(self, metrics: Dict[str, Any]) -> float:
-        """Calculate technical analysis score."""
-        score = 0.0
-        weight = 1.0 / len(metrics)  # Equal weight for each indicator
-        
-        for indicator, data in metrics.items():
-            if indicator == 'moving_averages':
-                if data.get('trend') in ['strong_uptrend', 'potential_reversal_up']:
-                    score += weight
-            elif indicator == 'relative_strength':
-                if data.get('rsi_trend') != 'overbought':
-                    score += weight
-        
-        return score
+    def _strategy_for(self, preferences: Dict[str, Any]) -> Tuple[List[str], Dict[str, float]]:
+        """Get the ranking factors and weights for the user's risk tolerance."""
+        weight_scheme = RISK_STRATEGIES.get(risk_level(preferences))
+        if weight_scheme is None:
+            return self.ranking_factors, self.weight_scheme
+        return list(weight_scheme), weight_scheme
     
-    def _rank_stocks(self, stock_scores: Dict[str, float]) -> List[tuple]:
-        """Rank stocks based on their composite scores."""
-        return sorted(stock_scores.items(), key=lambda x: x[1], reverse=True)
+    def _calculate_stock_scores(self, analysis_results: Dict[str, Any], ranking_factors: List[str],
+                                weight_scheme: Dict[str, float]) -> Tuple[List[str], np.ndarray]:
+        """Calculate composite scores for each stock based on analysis metrics and LLM insights."""
+        symbols = [symbol for symbol in analysis_results if symbol not in NON_STOCK_INPUTS]
+        scores = score_stocks([analysis_results[symbol] for symbol in symbols], ranking_factors, weight_scheme)
+        return symbols, scores
     
-    def _get_top_stocks(self, ranked_stocks: List[tuple], limit: int = 5) -> List[Dict[str, Any]]:
+    def _get_top_stocks(self, symbols: List[str], scores: np.ndarray, limit: int = 5) -> List[Dict[str, Any]]:
         """Get the top N ranked stocks with their scores."""
         return [{
-            'symbol': stock[0],
-            'score': stock[1],
-            'rank': idx + 1
-        } for idx, stock in enumerate(ranked_stocks[:limit])]
+            'symbol': symbols[index],
+            'score': float(scores[index]),
+            'rank': rank + 1
+        } for rank, index in enumerate(top_k(scores, limit))]
     
-    def _get_ranking_metrics(self, top_stocks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _get_ranking_metrics(self, top_stocks: List[Dict[str, Any]], ranking_factors: List[str]) -> Dict[str, Any]:
         """Get additional metrics about the ranking process."""
         return {
             'total_stocks_analyzed': len(top_stocks),
@@ -186,7 +108,7 @@ class StrategyAgent(BaseAgent):
                 'min': min(stock['score'] for stock in top_stocks),
                 'max': max(stock['score'] for stock in top_stocks)
             },
-            'ranking_factors_used': self.ranking_factors
+            'ranking_factors_used': ranking_factors
         }
     
     def process_message(self, message: BaseMessage) -> Dict[str, Any]:
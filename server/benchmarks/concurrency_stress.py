@@ -0,0 +1,173 @@
+"""Stress test one shared set of agents with many concurrent analysis requests.
+
+Every request has its own preferences (risk tolerance 1 to 5), AI settings and
+symbols, one of which fails to fetch. All requests first run one at a time,
+then all at once through the same agents and compiled workflow, and every
+concurrent response must equal its sequential one: no settings, results or
+symbol errors may leak between requests. Provider and LLM calls are replaced
+by deterministic in-process fakes with random latencies, so nothing leaves
+the process. The LLM cache and the indicator state store stay enabled, on
+empty files in a temporary directory for every pass. Which request fills
+them first is down to timing, so LLM cache hits are not compared and floats
+only up to rounding, as rebuilt and incrementally updated indicator states
+differ in the last bits.
+
+Usage (from the server folder):
+    python benchmarks/concurrency_stress.py [requests] [rounds]
+"""
+import asyncio
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import zlib
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GITHUB_TOKEN", "benchmark-token")
+
+import numpy as np  # noqa: E402
+
+from agents.columnar import to_jsonable  # noqa: E402
+from agents.indicator_state import IndicatorStateStore  # noqa: E402
+from agents.llm_cache import LLMCache  # noqa: E402
+from config import AGENT_CONFIG  # noqa: E402
+from orchestration import create_agents, create_workflow, run_analysis  # noqa: E402
+
+SHARED_SYMBOLS = ["AAA", "BBB", "CCC"]
+BARS = 120
+
+# Response keys that depend on which request filled the LLM cache first
+CACHE_KEYS = ("cache_hit", "llmCache")
+
+
+def _bars(symbol: str) -> dict:
+    """A symbol's deterministic random-walk daily bars."""
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, BARS)))
+    return {
+        "timestamp": 1700000000000 + np.arange(BARS, dtype=np.int64) * 86400000,
+        "open": close * (1 + rng.normal(0, 0.005, BARS)),
+        "high": close * 1.01,
+        "low": close * 0.99,
+        "close": close,
+        "volume": rng.integers(1000, 100000, BARS).astype(np.float64),
+    }
+
+
+async def _jitter() -> None:
+    await asyncio.sleep(random.uniform(0, 0.02))
+
+
+def _fake_io(agents: dict) -> None:
+    """Replace the agents' provider and LLM calls with in-process fakes."""
+    fetching = agents["data_fetching"]
+    analysis = agents["analysis"]
+
+    async def discover_symbols(inputs):
+        await _jitter()
+        request = inputs["preferences"]["sectors"][0]
+        return SHARED_SYMBOLS + [f"{request}X", f"{request}F"]
+
+    async def fetch_symbol(symbol, timeframe):
+        await _jitter()
+        if symbol.endswith("F"):
+            raise RuntimeError(f"provider outage for {symbol}")
+        return {"polygon": _bars(symbol)}
+
+    async def create(messages, model, temperature, **kwargs):
+        await _jitter()
+        symbol = messages[-1]["content"].split("Stock Symbol: ")[1].split()[0]
+        content = f"{symbol} looks fine to {model} at {temperature}. hold"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    async def close():
+        pass
+
+    fetching.discover_symbols = discover_symbols
+    fetching.fetch_symbol = fetch_symbol
+    analysis.llm_client.client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create)), close=close
+    )
+
+
+def _use_temp_stores(agents: dict, directory: str) -> None:
+    """Reopen the analysis agent's LLM cache and indicator state store on empty files in directory."""
+    analysis = agents["analysis"]
+    for store in (analysis.llm_client.cache, analysis.indicator_store):
+        if store is not None:
+            store.close()
+    config = AGENT_CONFIG["analysis"]
+    analysis.llm_client.cache = LLMCache(
+        {**config["llm_cache"], "path": os.path.join(directory, "llm_cache.sqlite3")}
+    )
+    analysis.indicator_store = IndicatorStateStore(
+        {**config["indicator_state"], "path": os.path.join(directory, "indicator_state.sqlite3")}
+    )
+
+
+def _matches(got, want) -> bool:
+    """Compare two responses, leaving out LLM cache hits and float rounding."""
+    if isinstance(got, dict) and isinstance(want, dict):
+        keys = set(got) | set(want)
+        return all(key in CACHE_KEYS or _matches(got.get(key), want.get(key)) for key in keys)
+    if isinstance(got, list) and isinstance(want, list):
+        return len(got) == len(want) and all(_matches(g, w) for g, w in zip(got, want))
+    if isinstance(got, float) and isinstance(want, float):
+        return math.isclose(got, want, rel_tol=1e-9, abs_tol=1e-12) or (math.isnan(got) and math.isnan(want))
+    return got == want
+
+
+def _request(index: int) -> dict:
+    return {
+        "preferences": {"risk_tolerance": index % 5 + 1, "sectors": [f"R{index}"]},
+        "ai_config": {"model": f"model-{index % 3}", "temperature": round(0.1 * (index % 10), 1)},
+        "timeframe": "1d",
+    }
+
+
+async def _analyze(workflow, request: dict) -> dict:
+    return to_jsonable(await run_analysis(workflow=workflow, **request))
+
+
+async def main() -> int:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    agents = create_agents()
+    _fake_io(agents)
+    workflow = create_workflow(agents).compile()
+    requests = [_request(index) for index in range(count)]
+    stores = tempfile.TemporaryDirectory()
+
+    _use_temp_stores(agents, os.path.join(stores.name, "sequential"))
+    start = time.perf_counter()
+    expected = [await _analyze(workflow, request) for request in requests]
+    sequential = time.perf_counter() - start
+
+    leaks = 0
+    for round_number in range(1, rounds + 1):
+        _use_temp_stores(agents, os.path.join(stores.name, f"round-{round_number}"))
+        start = time.perf_counter()
+        results = await asyncio.gather(*(_analyze(workflow, request) for request in requests))
+        elapsed = time.perf_counter() - start
+        mismatched = [index for index, (got, want) in enumerate(zip(results, expected)) if not _matches(got, want)]
+        leaks += len(mismatched)
+        print(
+            f"round {round_number}: {count} concurrent requests in {elapsed:.2f} s "
+            f"(sequential {sequential:.2f} s), {len(mismatched)} differ from their sequential run"
+            + (f": requests {mismatched[:10]}" if mismatched else "")
+        )
+        print(f"  LLM cache: {agents['analysis'].llm_client.get_metrics()}")
+
+    for name in ("data_fetching", "data_processing", "analysis"):
+        await agents[name].aclose()
+    stores.cleanup()
+    print("no state leaked between requests" if not leaks else f"{leaks} responses leaked state")
+    return 1 if leaks else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
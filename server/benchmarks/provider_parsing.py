@@ -0,0 +1,113 @@
+"""Benchmark decoding provider price responses into bar columns.
+
+Compares the old path (decode the whole JSON body into nested dicts, then
+convert them through a DataFrame) against the provider normalizers, which
+parse bars straight into typed NumPy columns while the JSON is decoded.
+Time and peak traced memory are reported per symbol for an Alpha Vantage
+TIME_SERIES_DAILY full response and a Polygon aggregates response.
+
+Usage (from the server folder):
+    python benchmarks/provider_parsing.py [bars] [iterations]
+"""
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GITHUB_TOKEN", "benchmark-token")
+
+import pandas as pd  # noqa: E402
+
+from agents.columnar import frame_to_columns  # noqa: E402
+from agents.normalizers import (  # noqa: E402
+    alpha_vantage_columns,
+    decode_alpha_vantage,
+    decode_polygon,
+    polygon_columns,
+)
+
+
+def _alpha_vantage_body(bars: int) -> bytes:
+    today = date.today()
+    series = {
+        str(today - timedelta(days=i)): {
+            "1. open": f"{100 + i * 0.01:.4f}",
+            "2. high": f"{101 + i * 0.01:.4f}",
+            "3. low": f"{99 + i * 0.01:.4f}",
+            "4. close": f"{100.5 + i * 0.01:.4f}",
+            "5. volume": str(1000000 + i),
+        }
+        for i in range(bars)
+    }
+    return json.dumps({"Meta Data": {"2. Symbol": "BENCH"}, "Time Series (Daily)": series}).encode()
+
+
+def _polygon_body(bars: int) -> bytes:
+    start = 1262304000000
+    results = [
+        {"v": 1000000 + i, "vw": 100.2, "o": 100 + i * 0.01, "c": 100.5 + i * 0.01,
+         "h": 101 + i * 0.01, "l": 99 + i * 0.01, "t": start + i * 86400000, "n": 5000}
+        for i in range(bars)
+    ]
+    return json.dumps({"ticker": "BENCH", "status": "OK", "results": results}).encode()
+
+
+def _old_alpha_vantage(body: bytes):
+    payload = json.loads(body)
+    df = pd.DataFrame.from_dict(payload["Time Series (Daily)"], orient="index")
+    df.columns = ["open", "high", "low", "close", "volume"]
+    df = df.astype(float).sort_index()
+    df.insert(0, "timestamp", pd.to_datetime(df.index, utc=True).asi8 // 1000000)
+    return frame_to_columns(df)
+
+
+def _old_polygon(body: bytes):
+    payload = json.loads(body)
+    df = pd.DataFrame.from_records(payload["results"], columns=["t", "o", "h", "l", "c", "v"])
+    df.columns = ["timestamp", "open", "high", "low", "close", "volume"]
+    return frame_to_columns(df)
+
+
+def _measure(fn, body: bytes, iterations: int):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(body)
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    fn(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, peak
+
+
+def _report(label: str, timings: list, peak: int) -> None:
+    print(
+        f"{label:<34} mean {statistics.mean(timings):8.3f} ms"
+        f"   p50 {statistics.median(timings):8.3f} ms   peak {peak / 1024 / 1024:7.2f} MiB"
+    )
+
+
+def main() -> None:
+    bars = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    cases = [
+        ("alpha_vantage", _alpha_vantage_body(bars), _old_alpha_vantage,
+         lambda body: alpha_vantage_columns(decode_alpha_vantage(body))),
+        ("polygon", _polygon_body(bars), _old_polygon,
+         lambda body: polygon_columns(decode_polygon(body))),
+    ]
+    print(f"Decoding {bars} bars per symbol over {iterations} iterations")
+    for provider, body, old, new in cases:
+        print(f"{provider} ({len(body) / 1024:.0f} KiB body)")
+        _report("  dicts + DataFrame", *_measure(old, body, iterations))
+        _report("  streaming normalizer", *_measure(new, body, iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark scoring and ranking a screening universe in StrategyAgent.
+
+Compares the old path (score each symbol in a Python loop with dict lookups
+per factor, then fully sort every score to take the top K) against the
+factor-matrix engine (one symbols x factors matrix, one dot product with the
+weight scheme, and partial top-K selection). Both must pick the same stocks.
+
+Usage (from the server folder):
+    python benchmarks/strategy_ranking.py [symbols] [top_k] [iterations]
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GITHUB_TOKEN", "benchmark-token")
+
+from agents.scoring import score_stocks, top_k  # noqa: E402
+from config import AGENT_CONFIG  # noqa: E402
+
+RANKING_FACTORS = AGENT_CONFIG["strategy"]["ranking_factors"]
+WEIGHT_SCHEME = AGENT_CONFIG["strategy"]["weight_scheme"]
+
+
+def _analysis_results(count: int) -> dict:
+    rng = random.Random(42)
+    results = {}
+    for index in range(count):
+        metrics = {
+            "momentum": {"momentum_trend": rng.choice(["positive", "negative"])},
+            "moving_averages": {"trend": rng.choice(["strong_uptrend", "potential_reversal_up", "sideways"])},
+            "volatility": {"volatility": rng.uniform(5, 120)},
+            "volume": {"volume_trend": rng.choice(["increasing", "decreasing"])},
+            "relative_strength": {"rsi": rng.uniform(10, 90), "rsi_trend": rng.choice(["overbought", "neutral"])},
+        }
+        if index % 50 == 0:
+            metrics["llm_analysis"] = {"confidence": 0.7}
+        results[f"SYM{index:05d}"] = metrics
+    return results
+
+
+def _old_score(metrics: dict) -> float:
+    """StrategyAgent._calculate_stock_scores for one symbol, before the factor matrix."""
+    score = 0.0
+    perf = 1.0 if metrics["momentum"].get("momentum_trend") == "positive" else 0.0
+    trend = metrics["moving_averages"].get("trend", "")
+    perf += 1.0 if trend == "strong_uptrend" else 0.5 if trend == "potential_reversal_up" else 0.0
+    score += perf / 2.0 * WEIGHT_SCHEME["performance"]
+    volatility = metrics["volatility"].get("volatility")
+    score += (1.0 - min(volatility / 100, 1.0)) * WEIGHT_SCHEME["risk_metrics"]
+    sentiment = 0.5 if metrics["volume"].get("volume_trend") == "increasing" else 0.0
+    rsi = metrics["relative_strength"].get("rsi")
+    sentiment += 0.5 if 40 <= rsi <= 60 else 0.0
+    score += sentiment * WEIGHT_SCHEME["market_sentiment"]
+    weight = 1.0 / len(metrics)
+    technical = 0.0
+    for indicator, data in metrics.items():
+        if indicator == "moving_averages" and data.get("trend") in ["strong_uptrend", "potential_reversal_up"]:
+            technical += weight
+        elif indicator == "relative_strength" and data.get("rsi_trend") != "overbought":
+            technical += weight
+    score += technical * WEIGHT_SCHEME["technical_indicators"]
+    if "llm_analysis" in metrics:
+        score = score * 0.7 + metrics["llm_analysis"].get("confidence_score", 0.5) * 0.3
+    return score
+
+
+def _old_rank(results: dict, k: int) -> list:
+    scores = {symbol: _old_score(metrics) for symbol, metrics in results.items()}
+    return [symbol for symbol, _ in sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]]
+
+
+def _new_rank(results: dict, k: int) -> list:
+    symbols = list(results)
+    scores = score_stocks([results[symbol] for symbol in symbols], RANKING_FACTORS, WEIGHT_SCHEME)
+    return [symbols[index] for index in top_k(scores, k)]
+
+
+def _time_ms(fn, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _report(label: str, timings: list) -> None:
+    print(f"{label:<30} mean {statistics.mean(timings):9.3f} ms   p50 {statistics.median(timings):9.3f} ms")
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    iterations = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    results = _analysis_results(count)
+    old, new = _old_rank(results, k), _new_rank(results, k)
+    if old != new:
+        raise SystemExit(f"Rankings differ: {old} != {new}")
+
+    print(f"Ranking the top {k} of {count} symbols over {iterations} iterations")
+    _report("python loop + full sort", _time_ms(lambda: _old_rank(results, k), iterations))
+    _report("factor matrix + top-k", _time_ms(lambda: _new_rank(results, k), iterations))
+
+
+if __name__ == "__main__":
+    main()
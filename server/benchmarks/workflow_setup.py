@@ -0,0 +1,55 @@
+"""Benchmark the per-request workflow setup cost of /api/analyze.
+
+Compares building the agents and compiling the LangGraph workflow on every
+request (the old behaviour of run_analysis) against reusing one workflow
+compiled at startup. Only the setup is timed; no provider or LLM calls are made.
+
+Usage (from the server folder):
+    python benchmarks/workflow_setup.py [iterations]
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GITHUB_TOKEN", "benchmark-token")
+
+from orchestration import create_workflow, get_workflow  # noqa: E402
+
+
+def _time_ms(fn, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _report(label: str, timings: list) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(
+        f"{label:<28} mean {statistics.mean(timings):9.3f} ms"
+        f"   p50 {statistics.median(timings):9.3f} ms   p95 {p95:9.3f} ms"
+    )
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    # Before: every request rebuilt all agents and recompiled the graph
+    before = _time_ms(lambda: create_workflow().compile(), iterations)
+
+    # After: the app compiles once at startup and requests reuse it
+    get_workflow()
+    after = _time_ms(get_workflow, iterations)
+
+    print(f"Per-request workflow setup over {iterations} iterations")
+    _report("build + compile per request", before)
+    _report("precompiled at startup", after)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class SingleFlight:
+    """Coalesce identical concurrent calls onto one shared execution.
+
+    The first caller for a key starts the work; callers arriving while it is
+    in flight wait for the same result. Successful results can additionally
+    be kept for a short time so requests arriving just after completion are
+    served without running the work again.
+    """
+
+    def __init__(self, result_ttl: float = 0.0, max_results: int = 256):
+        """Initialize the coalescer.
+
+        Args:
+            result_ttl: Seconds to keep a finished result; 0 disables the result cache
+            max_results: Maximum number of finished results kept
+        """
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._results: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._stats = {"executions": 0, "coalesced": 0, "cache_hits": 0}
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Hash JSON-serializable request parts into a stable key."""
+        encoded = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        cache_if: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """Run fn once per key, sharing its result with concurrent callers.
+
+        Args:
+            key: Request key, e.g. from make_key()
+            fn: Coroutine function doing the work
+            cache_if: Predicate deciding whether a result may be cached
+
+        Returns:
+            Any: The result of the shared execution
+        """
+        cached = self._results.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                self._results.move_to_end(key)
+                self._stats["cache_hits"] += 1
+                return cached[1]
+            del self._results[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self._stats["executions"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done, cache_if))
+        else:
+            self._stats["coalesced"] += 1
+
+        # Shielded so one disconnecting caller does not cancel the work for the others
+        return await asyncio.shield(task)
+
+    def _finish(
+        self,
+        key: str,
+        task: asyncio.Task,
+        cache_if: Optional[Callable[[Any], bool]],
+    ) -> None:
+        """Release the in-flight slot and cache the result if allowed."""
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None or self.result_ttl <= 0:
+            return
+        result = task.result()
+        if cache_if is not None and not cache_if(result):
+            return
+        self._results[key] = (time.monotonic() + self.result_ttl, result)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get execution, coalescing and cache counters."""
+        return {
+            **self._stats,
+            "in_flight": len(self._inflight),
+            "cached_results": len(self._results),
+        }
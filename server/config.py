@@ -14,17 +14,98 @@ ALPHA_VANTAGE_BASE_URL = "https://www.alphavantage.co/query"
 POLYGON_BASE_URL = "https://api.polygon.io/v2"
 FINHUB_BASE_URL = "https://finnhub.io/api/v1"
 
+# Local data directory (caches and reference data)
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# API Configuration
+SERVER_CONFIG = {
+    # Identical concurrent /api/analyze requests share one workflow run;
+    # successful results are then reused for result_ttl seconds
+    "coalescing": {
+        "enabled": True,
+        "result_ttl": 30,
+        "max_results": 256,
+    },
+}
+
 # Agent Configuration
 AGENT_CONFIG = {
     "data_fetching": {
         "apis": ["alpha_vantage", "polygon", "finhub"],
         "request_timeout": 30,
         "retry_attempts": 3,
+        # Symbols discovery screens in for a detailed look. Discovery runs inside the
+        # request and symbols without fresh stored bars are fetched within the
+        # provider rate limits below (5 calls a minute), so keep this small
+        "max_discovered_symbols": 20,
+        # Maximum in-flight requests per provider
+        "max_concurrency": {
+            "alpha_vantage": 5,
+            "polygon": 5,
+            "finhub": 10,
+        },
+        # Free-tier quotas; requests are queued to stay under these
+        "rate_limits": {
+            "alpha_vantage": {"requests": 5, "per_seconds": 60},
+            "polygon": {"requests": 5, "per_seconds": 60},
+            "finhub": {"requests": 60, "per_seconds": 60, "burst": 30},
+        },
+        # Jittered exponential backoff between retry attempts
+        "backoff": {"base_seconds": 0.5, "max_seconds": 8.0},
+        # Duplicate a request once it runs past the provider's recent p95 latency
+        "hedging": {"enabled": True, "percentile": 0.95, "min_samples": 20},
+        # Local reference data of symbol -> sector, market-cap bucket and dividend
+        # flag; discovered symbols are screened against it before any fetch
+        "screening": {
+            "enabled": True,
+            "path": os.path.join(DATA_DIR, "screening_index.csv"),
+            "refresh_seconds": 3600,
+            # Keep discovered symbols that the index does not know
+            "include_unknown": False,
+        },
+        # Market overview shared by all requests for discovery; the first request after
+        # it is refresh_seconds old refreshes it, and if that fails the old one is
+        # served until it is max_age_seconds old
+        "market_snapshot": {
+            "refresh_seconds": 60,
+            "max_age_seconds": 300,
+        },
+        # On-disk provider response cache; daily bars expire at daily_expiry market time
+        "cache": {
+            "enabled": True,
+            "path": os.path.join(DATA_DIR, "cache", "market_data.sqlite3"),
+            "max_entries": 5000,
+            "max_bytes": 512 * 1024 * 1024,
+            # Stored bars of all series; whole series are evicted, least recently loaded first
+            "max_bars": 10_000_000,
+            "ttl_seconds": {"quote": 15, "overview": 60, "intraday": 300},
+            "timezone": "America/New_York",
+            "daily_expiry": "16:30",
+            # Where stored bars live: "sqlite" in the cache file above, or "mmap" in a
+            # memory-mapped columnar store shared by all workers through the page cache
+            "bar_store": {
+                "backend": "mmap",
+                "path": os.path.join(DATA_DIR, "bars"),
+                "initial_capacity": 256,
+                # Freed regions are reused after this long, once no request still reads them
+                "reuse_after_seconds": 300,
+            },
+        },
     },
     "data_processing": {
+        # Symbols processed concurrently, e.g. by the per-symbol paths of one or several
+        # requests, are cleaned together, up to batch_size at a time
         "batch_size": 100,
+        # How long a partial batch waits for symbols processed concurrently
+        "batch_linger_seconds": 0.01,
         "normalization": True,
         "cleaning_rules": ["remove_nulls", "handle_outliers"],
+        # Where CPU-bound work runs, in batches of batch_size symbols: "thread" (NumPy
+        # releases the GIL), "process" (arrays passed through shared memory) or "inline"
+        "executor": {
+            "backend": "thread",
+            "max_workers": 4,
+        },
     },
     "analysis": {
         "metrics": [
@@ -33,7 +114,37 @@ AGENT_CONFIG = {
             "volatility",
             "moving_averages",
             "relative_strength",
-        ]
+        ],
+        # Maximum number of LLM requests in flight at once
+        "llm_concurrency": 5,
+        # Symbols packed into one LLM call; 1 sends one call per symbol
+        "llm_batch_size": 1,
+        # How long a partial LLM batch waits for symbols analyzed concurrently
+        "llm_batch_linger_seconds": 0.05,
+        # Local cache of LLM analyses keyed by model, temperature and prompt hash;
+        # bucket_numeric also matches prompts whose price/volume/change differ slightly
+        "llm_cache": {
+            "enabled": True,
+            "path": os.path.join(DATA_DIR, "cache", "llm_cache.sqlite3"),
+            "ttl_seconds": 900,
+            "max_entries": 2000,
+            "bucket_numeric": False,
+        },
+        # Indicators of symbols analyzed concurrently on the same timeframe are computed
+        # together on the executor, as one price matrix of up to indicator_batch_size symbols
+        "indicator_batch_size": 500,
+        # How long a partial indicator batch waits for symbols analyzed concurrently
+        "indicator_batch_linger_seconds": 0.01,
+        "executor": {
+            "backend": "thread",
+            "max_workers": 4,
+        },
+        # Running indicator state per symbol and timeframe, kept next to the price cache,
+        # so new bars update the metrics without recomputing whole series
+        "indicator_state": {
+            "enabled": True,
+            "path": os.path.join(DATA_DIR, "cache", "indicator_state.sqlite3"),
+        },
     },
     "strategy": {
         "ranking_factors": [
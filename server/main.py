@@ -1,8 +1,14 @@
+from contextlib import asynccontextmanager
+import json
 from fastapi import FastAPI, HTTPException, Body
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import uvicorn
-from orchestration import run_analysis
+from orchestration import create_agents, create_workflow, run_analysis, stream_analysis
+from coalescing import SingleFlight
+from agents.columnar import to_jsonable
+from config import SERVER_CONFIG
 import asyncio
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -23,7 +29,8 @@ class InvestmentPreferences(BaseModel):
 
 
 class AnalysisRequest(BaseModel):
-    symbols: List[str]
+    # Symbols to analyze; leave empty to discover candidates from the market overview
+    symbols: List[str] = []
     ai_settings: Optional[AISettings] = None
     investment_preferences: Optional[InvestmentPreferences] = None
 
@@ -36,11 +43,39 @@ class AnalysisResponse(BaseModel):
     errors: Optional[List[str]] = None
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the agents and compile the workflow once for the app's lifetime.
+
+    The screening index is reloaded in the background; the market snapshot
+    used for discovery is refreshed by the requests that need it.
+    """
+    app.state.agents = create_agents()
+    app.state.workflow = create_workflow(app.state.agents).compile()
+    coalescing = SERVER_CONFIG["coalescing"]
+    app.state.analysis_flights = SingleFlight(
+        result_ttl=coalescing["result_ttl"] if coalescing["enabled"] else 0,
+        max_results=coalescing["max_results"],
+    )
+    data_fetching = app.state.agents["data_fetching"]
+    background_tasks = []
+    if data_fetching.screening is not None:
+        background_tasks.append(asyncio.create_task(data_fetching.screening.refresh_periodically()))
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await app.state.agents["data_fetching"].aclose()
+    await app.state.agents["data_processing"].aclose()
+    await app.state.agents["analysis"].aclose()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="Stock Analysis API",
     description="API for performing AI-driven stock analysis",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 
@@ -54,55 +89,85 @@ app.add_middleware(
 )
 
 
-@app.post("/api/analyze")
-async def analyze_stocks(request: AnalysisRequest = Body(...)):
-    """
-    Analyze stock symbols based on provided criteria and preferences.
+# Convert timeframe format from frontend to what run_analysis expects
+TIMEFRAME_MAPPING = {
+    "1day": "1d",
+    "1week": "1wk",
+    "1month": "1mo",
+    "3month": "3mo",
+    "6month": "6mo",
+    "1year": "1y",
+    "5year": "5y",
+}
 
-    - **symbols**: List of stock ticker symbols to analyze
-    - **ai_settings**: AI model configuration
-    - **investment_preferences**: User's investment criteria and preferences
+
+def build_run_settings(request: AnalysisRequest):
+    """Validate a request and derive the workflow settings from it.
+
+    Returns:
+        Tuple of symbols, preferences, AI config and analysis timeframe
     """
-    # Validate input
-    if not request.symbols or len(request.symbols) == 0:
+    # Validate input; symbols keep their order, which decides which get an LLM analysis
+    symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in request.symbols))
+    if "" in symbols:
         raise HTTPException(
-            status_code=400, detail="At least one stock symbol is required"
+            status_code=400, detail="Stock symbols must not be empty"
         )
 
     # Set defaults if not provided
     ai_settings = request.ai_settings or AISettings()
     investment_preferences = request.investment_preferences or InvestmentPreferences()
 
-    try:
-        # Convert timeframe format from frontend to what run_analysis expects
-        timeframe_mapping = {
-            "1day": "1d",
-            "1week": "1wk",
-            "1month": "1mo",
-            "3month": "3mo",
-            "6month": "6mo",
-            "1year": "1y",
-            "5year": "5y",
-        }
-        analysis_timeframe = timeframe_mapping.get(
-            investment_preferences.timeframe, "1d"
-        )
+    analysis_timeframe = TIMEFRAME_MAPPING.get(investment_preferences.timeframe, "1d")
+
+    # List preferences are sorted so equivalent requests share a coalescing key
+    preferences = {
+        "performance_criteria": sorted(investment_preferences.performanceCriteria),
+        "sectors": sorted(investment_preferences.sectors),
+        "market_cap": sorted(investment_preferences.marketCap),
+        "risk_tolerance": investment_preferences.riskTolerance,
+        "dividend_preference": investment_preferences.dividendPreference,
+    }
+    ai_config = {
+        "model": ai_settings.model,
+        "temperature": ai_settings.temperature,
+    }
+    return symbols, preferences, ai_config, analysis_timeframe
 
+
+@app.post("/api/analyze")
+async def analyze_stocks(request: AnalysisRequest = Body(...)):
+    """
+    Analyze stock symbols based on provided criteria and preferences.
+
+    - **symbols**: Stock ticker symbols to analyze; when empty, candidates are
+      discovered from the market overview and screened against the preferences
+    - **ai_settings**: AI model configuration
+    - **investment_preferences**: User's investment criteria and preferences
+    """
+    symbols, preferences, ai_config, analysis_timeframe = build_run_settings(request)
+
+    try:
         # Run the analysis with additional context from preferences
-        results = await run_analysis(
-            preferences={
-                "performance_criteria": investment_preferences.performanceCriteria,
-                "sectors": investment_preferences.sectors,
-                "market_cap": investment_preferences.marketCap,
-                "risk_tolerance": investment_preferences.riskTolerance,
-                "dividend_preference": investment_preferences.dividendPreference,
-            },
-            ai_config={
-                "model": ai_settings.model,
-                "temperature": ai_settings.temperature,
-            },
-            timeframe=analysis_timeframe,
-        )
+        async def analyze():
+            # Stages exchange NumPy data; convert to plain JSON types only here
+            return to_jsonable(await run_analysis(
+                preferences=preferences,
+                ai_config=ai_config,
+                timeframe=analysis_timeframe,
+                workflow=app.state.workflow,
+                symbols=symbols,
+            ))
+
+        # Identical concurrent requests share a single run of the workflow
+        if not SERVER_CONFIG["coalescing"]["enabled"]:
+            results = await analyze()
+        else:
+            results = await app.state.analysis_flights.do(
+                SingleFlight.make_key(symbols, preferences, ai_config, analysis_timeframe),
+                analyze,
+                cache_if=lambda result: result.get("status") == "success",
+            )
 
         return results
 
@@ -110,12 +175,57 @@ async def analyze_stocks(request: AnalysisRequest = Body(...)):
         return {"status": "error", "errors": [str(e)]}
 
 
+@app.post("/api/analyze/stream")
+async def analyze_stocks_stream(request: AnalysisRequest = Body(...)):
+    """
+    Analyze stock symbols like /api/analyze, streaming partial results as NDJSON.
+
+    Each line is one JSON event: "stage" when a workflow stage finishes,
+    "symbol" with a symbol's analysis as soon as it is ready, "top_stocks"
+    once the stocks are ranked, and a final "result" with the full response.
+    """
+    symbols, preferences, ai_config, analysis_timeframe = build_run_settings(request)
+
+    async def events():
+        try:
+            async for event in stream_analysis(
+                preferences=preferences,
+                ai_config=ai_config,
+                timeframe=analysis_timeframe,
+                workflow=app.state.workflow,
+                symbols=symbols,
+            ):
+                yield json.dumps(to_jsonable(event), default=str) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "result", "status": "error", "errors": [str(e)]}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @app.get("/api/health")
 async def health_check():
     """Check if the API is running"""
     return {"status": "healthy"}
 
 
+@app.get("/api/metrics/fetch")
+async def get_fetch_metrics():
+    """Get provider rate limiter queue depth and wait-time metrics"""
+    return app.state.agents["data_fetching"].get_metrics()
+
+
+@app.get("/api/metrics/llm")
+async def get_llm_metrics():
+    """Get LLM analysis cache counters"""
+    return app.state.agents["analysis"].llm_client.get_metrics()
+
+
+@app.get("/api/metrics/coalescing")
+async def get_coalescing_metrics():
+    """Get request coalescing and result cache counters"""
+    return app.state.analysis_flights.get_metrics()
+
+
 # Add some additional endpoints that might be useful
 @app.get("/api/timeframes")
 async def get_available_timeframes():
@@ -1,8 +1,12 @@
-from typing import Dict, Any, List, Annotated, Sequence, TypedDict
+from typing import Dict, Any, AsyncIterator, List, Annotated, Optional, Sequence, TypedDict, Union
 from langchain_core.messages import BaseMessage
-from langgraph.graph import StateGraph, END
+from langgraph.config import get_stream_writer
+from langgraph.graph import StateGraph, START, END
+from langgraph.graph.state import CompiledStateGraph
+from langgraph.types import Send
 
 # from langgraph.prebuilt import ToolExecutor
+from agents.base_agent import start_run_state
 from agents.data_fetching_agent import DataFetchingAgent
 from agents.data_processing_agent import DataProcessingAgent
 from agents.analysis_agent import AnalysisAgent
@@ -11,36 +15,79 @@ from agents.reporting_agent import ReportingAgent
 from config import AGENT_CONFIG
 
 
+# Number of symbols, in request or discovery order, that get an LLM analysis
+LLM_ANALYSIS_SYMBOLS = 5
+
+
+def merge_results(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """Reducer merging the per-symbol results written by parallel symbol paths."""
+    return {**left, **right}
+
+
 class WorkflowState(TypedDict):
     """Type definition for the workflow state."""
 
     messages: Sequence[BaseMessage]
     current_step: str
-    stock_data: Dict[str, Any]
-    processed_data: Dict[str, Any]
-    analysis_results: Dict[str, Any]
+    preferences: Dict[str, Any]
+    ai_config: Dict[str, Any]
+    timeframe: str
+    symbols: List[str]
+    analysis_results: Annotated[Dict[str, Any], merge_results]
+    symbol_errors: Annotated[Dict[str, str], merge_results]
     strategy_results: Dict[str, Any]
     final_report: Dict[str, Any]
     errors: List[str]
 
 
-def create_workflow(preferences: Dict[str, Any] = {}, ai_config: Dict[str, Any] = {}, timeframe: str = "1d") -> StateGraph:
+class SymbolState(TypedDict):
+    """Input of one symbol's fetch, process and analyze path."""
+
+    symbol: str
+    llm_analysis: bool
+    preferences: Dict[str, Any]
+    ai_config: Dict[str, Any]
+    timeframe: str
+
+
+def create_agents() -> Dict[str, Any]:
+    """Create one instance of every agent in the workflow.
+
+    Returns:
+        Dict[str, Any]: Agents keyed by their AGENT_CONFIG section
+    """
+    return {
+        "data_fetching": DataFetchingAgent(AGENT_CONFIG["data_fetching"]),
+        "data_processing": DataProcessingAgent(AGENT_CONFIG["data_processing"]),
+        "analysis": AnalysisAgent(AGENT_CONFIG["analysis"]),
+        "strategy": StrategyAgent(AGENT_CONFIG["strategy"]),
+        "reporting": ReportingAgent(AGENT_CONFIG["reporting"]),
+    }
+
+
+def create_workflow(agents: Optional[Dict[str, Any]] = None) -> StateGraph:
     """Create the stock analysis workflow graph.
 
+    Per-request settings (preferences, AI config and timeframe) are read from
+    the workflow state, so the graph can be compiled once and reused. Unless
+    the request names its symbols, they are discovered first. Every symbol is
+    then fetched, processed and analyzed on its own path. The paths run
+    concurrently, the agents gather their CPU-bound work into batches, and
+    their results are merged into analysis_results before the strategy stage.
+
     Args:
-        preferences: User investment preferences
-        ai_config: AI model configuration
-        timeframe: Time period for analysis
+        agents: Agents to wire into the graph, as returned by create_agents()
 
     Returns:
         StateGraph: Configured workflow
     """
     # Initialize agents
-    data_fetching = DataFetchingAgent(AGENT_CONFIG["data_fetching"])
-    data_processing = DataProcessingAgent(AGENT_CONFIG["data_processing"])
-    analysis = AnalysisAgent(AGENT_CONFIG["analysis"])
-    strategy = StrategyAgent(AGENT_CONFIG["strategy"])
-    reporting = ReportingAgent(AGENT_CONFIG["reporting"])
+    agents = agents or create_agents()
+    data_fetching = agents["data_fetching"]
+    data_processing = agents["data_processing"]
+    analysis = agents["analysis"]
+    strategy = agents["strategy"]
+    reporting = agents["reporting"]
 
     # Create workflow graph
     workflow = StateGraph(WorkflowState)
@@ -52,50 +99,82 @@ def create_workflow(preferences: Dict[str, Any] = {}, ai_config: Dict[str, Any]
             return END
         return state["current_step"]
 
-    # Data fetching step
-    async def fetch_data(state: WorkflowState) -> WorkflowState:
+    # Symbol discovery step
+    async def discover_symbols(state: WorkflowState) -> WorkflowState:
         try:
-            inputs = {
-                "timeframe": timeframe,
-                "preferences": preferences,
-                "ai_config": ai_config
-            }
-            state["stock_data"] = await data_fetching.run(inputs, {})
-            state["current_step"] = "process_data"
+            state["symbols"] = await data_fetching.discover_symbols({"preferences": state["preferences"]})
+            state["current_step"] = "analyze_symbol"
         except Exception as e:
             state["errors"].append(f"Data fetching error: {str(e)}")
         return state
 
-    # Data processing step
-    async def process_data(state: WorkflowState) -> WorkflowState:
-        try:
-            state["processed_data"] = await data_processing.run(state["stock_data"], {})
-            state["current_step"] = "analyze_data"
-        except Exception as e:
-            state["errors"].append(f"Data processing error: {str(e)}")
-        return state
+    # Explicitly requested symbols skip discovery and fan out right away
+    def route_start(state: WorkflowState) -> Union[str, List[Send]]:
+        if state["symbols"]:
+            return fan_out(state)
+        return "discover_symbols"
+
+    # Fan out: every symbol runs its own path concurrently
+    def fan_out(state: WorkflowState) -> Union[str, List[Send]]:
+        if state["errors"]:
+            return END
+        if not state["symbols"]:
+            return "apply_strategy"
+        return [
+            Send("analyze_symbol", {
+                "symbol": symbol,
+                "llm_analysis": index < LLM_ANALYSIS_SYMBOLS,
+                "preferences": state["preferences"],
+                "ai_config": state["ai_config"],
+                "timeframe": state["timeframe"],
+            })
+            for index, symbol in enumerate(state["symbols"])
+        ]
 
-    # Analysis step
-    async def analyze_data(state: WorkflowState) -> WorkflowState:
+    # Per-symbol step: fetch, process and analyze one symbol. A failure only
+    # drops this symbol and is reported in symbol_errors.
+    async def analyze_symbol(state: SymbolState) -> Dict[str, Any]:
+        symbol = state["symbol"]
+        stream_writer = get_stream_writer()
+        # Errors the agents record on this path are this symbol's alone
+        start_run_state()
+        stage = "Data fetching"
         try:
+            data = await data_fetching.fetch_symbol(symbol, state["timeframe"])
+            if not data:
+                raise ValueError("no data from any provider")
+
+            stage = "Data processing"
+            processed = await data_processing.run({symbol: data, "preferences": state["preferences"]}, {})
+            if symbol not in processed:
+                raise ValueError(data_processing.get_state(f"error_processing_{symbol}") or "no usable bars")
+
+            stage = "Analysis"
             inputs = {
-                **state["processed_data"],
-                "preferences": preferences,
-                "ai_settings": ai_config
+                **processed,
+                "preferences": state["preferences"],
+                "ai_settings": state["ai_config"],
+                "timeframe": state["timeframe"],
+                "llm_symbols": [symbol] if state["llm_analysis"] else [],
             }
-            print(f"[Orchestration] Running analysis with AI config: {ai_config}")
-            state["analysis_results"] = await analysis.run(inputs, {})
-            state["current_step"] = "apply_strategy"
+            results = await analysis.run(inputs, {})
+
+            # The symbol's analysis and score go out on the custom stream as soon as it is done
+            score = strategy.score_stock(results[symbol], state["preferences"])
+            stream_writer(_symbol_event(symbol, results[symbol], score))
+            return {"analysis_results": results}
         except Exception as e:
-            state["errors"].append(f"Analysis error: {str(e)}")
-        return state
+            error = f"{stage} error for {symbol}: {str(e)}"
+            print(f"[Orchestration] {error}")
+            stream_writer({"event": "symbol", "symbol": symbol, "status": "error", "error": error})
+            return {"symbol_errors": {symbol: error}}
 
     # Strategy application step
     async def apply_strategy(state: WorkflowState) -> WorkflowState:
         try:
             inputs = {
                 **state["analysis_results"],
-                "preferences": preferences
+                "preferences": state["preferences"]
             }
             state["strategy_results"] = await strategy.run(inputs, {})
             state["current_step"] = "generate_report"
@@ -113,23 +192,17 @@ def create_workflow(preferences: Dict[str, Any] = {}, ai_config: Dict[str, Any]
         return state
 
     # Configure workflow edges
-    workflow.add_node("fetch_data", fetch_data)
-    workflow.add_node("process_data", process_data)
-    workflow.add_node("analyze_data", analyze_data)
+    workflow.add_node("discover_symbols", discover_symbols)
+    workflow.add_node("analyze_symbol", analyze_symbol)
     workflow.add_node("apply_strategy", apply_strategy)
     workflow.add_node("generate_report", generate_report)
 
-    # Set conditional transitions
-    workflow.set_entry_point("fetch_data")
-    workflow.add_conditional_edges(
-        "fetch_data", should_continue, {"process_data": "process_data", END: END}
-    )
-    workflow.add_conditional_edges(
-        "process_data", should_continue, {"analyze_data": "analyze_data", END: END}
-    )
+    # Set transitions; apply_strategy waits for every symbol path to finish
+    workflow.add_conditional_edges(START, route_start, ["discover_symbols", "analyze_symbol"])
     workflow.add_conditional_edges(
-        "analyze_data", should_continue, {"apply_strategy": "apply_strategy", END: END}
+        "discover_symbols", fan_out, ["analyze_symbol", "apply_strategy", END]
     )
+    workflow.add_edge("analyze_symbol", "apply_strategy")
     workflow.add_conditional_edges(
         "apply_strategy",
         should_continue,
@@ -140,10 +213,23 @@ def create_workflow(preferences: Dict[str, Any] = {}, ai_config: Dict[str, Any]
     return workflow
 
 
+_compiled_workflow: Optional[CompiledStateGraph] = None
+
+
+def get_workflow() -> CompiledStateGraph:
+    """Return the process-wide compiled workflow, compiling it on first use."""
+    global _compiled_workflow
+    if _compiled_workflow is None:
+        _compiled_workflow = create_workflow().compile()
+    return _compiled_workflow
+
+
 async def run_analysis(
     preferences: Dict[str, Any] = {},
     ai_config: Dict[str, Any] = {},
-    timeframe: str = "1d"
+    timeframe: str = "1d",
+    workflow: Optional[CompiledStateGraph] = None,
+    symbols: Optional[List[str]] = None,
 ) -> Dict[str, Any]:
     """Run the complete stock analysis workflow.
 
@@ -151,39 +237,143 @@ async def run_analysis(
         preferences: User investment preferences
         ai_config: AI model configuration
         timeframe: Time period for analysis
+        workflow: Pre-compiled workflow to run; defaults to get_workflow()
+        symbols: Symbols to analyze; market discovery only runs when none are given
 
     Returns:
         Dict[str, Any]: Analysis results and final report with top stock recommendations
     """
-    # Create and compile workflow
-    workflow = create_workflow(preferences, ai_config, timeframe)
-    app = workflow.compile()
+    app = workflow or get_workflow()
 
     # graph = app.get_graph(xray=True).draw_mermaid_png()  # Generate the graph
     # with open("graph_image.png", "wb") as f:
     #     f.write(graph)
 
-    # Initialize state
-    initial_state = {
+    # Execute workflow using async API
+    start_run_state()
+    final_state = await app.ainvoke(_initial_state(preferences, ai_config, timeframe, symbols))
+    return _build_response(final_state, preferences, ai_config, timeframe)
+
+
+async def stream_analysis(
+    preferences: Dict[str, Any] = {},
+    ai_config: Dict[str, Any] = {},
+    timeframe: str = "1d",
+    workflow: Optional[CompiledStateGraph] = None,
+    symbols: Optional[List[str]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Run the stock analysis workflow, yielding partial results as they become available.
+
+    Yields one event per finished stage, one per symbol as soon as its path
+    is done, with its indicators, LLM analysis if any and score, or its
+    error, then the ranked top stocks once the strategy stage is done, and
+    finally the same response run_analysis would return.
+
+    Args:
+        preferences: User investment preferences
+        ai_config: AI model configuration
+        timeframe: Time period for analysis
+        workflow: Pre-compiled workflow to run; defaults to get_workflow()
+        symbols: Symbols to analyze; market discovery only runs when none are given
+
+    Yields:
+        Dict[str, Any]: Events with an 'event' key of 'stage', 'symbol', 'top_stocks' or 'result'
+    """
+    app = workflow or get_workflow()
+    final_state = _initial_state(preferences, ai_config, timeframe, symbols)
+    start_run_state()
+
+    stream_modes = ["values", "updates", "custom"]
+    async for mode, chunk in app.astream(final_state, stream_mode=stream_modes):
+        if mode == "custom":
+            yield chunk
+            continue
+        if mode == "values":
+            final_state = chunk
+            continue
+        for stage, state in chunk.items():
+            # Symbol paths report through their own 'symbol' events
+            if stage == "analyze_symbol":
+                continue
+            yield {
+                "event": "stage",
+                "stage": stage,
+                "status": "error" if state["errors"] else "completed",
+            }
+            if stage == "apply_strategy" and not state["errors"]:
+                yield {
+                    "event": "top_stocks",
+                    "topStocks": state["strategy_results"].get("top_stocks", []),
+                }
+
+    yield {"event": "result", **_build_response(final_state, preferences, ai_config, timeframe)}
+
+
+def _symbol_event(symbol: str, result: Dict[str, Any], score: float) -> Dict[str, Any]:
+    """Build the stream event of a symbol whose analysis is done."""
+    event = {
+        "event": "symbol",
+        "symbol": symbol,
+        "status": "success",
+        "score": score,
+        "indicators": {name: value for name, value in result.items() if name != "llm_analysis"},
+    }
+    llm_analysis = result.get("llm_analysis")
+    if llm_analysis is not None:
+        event["llm_analysis"] = {
+            "status": llm_analysis.get("status"),
+            "analysis": llm_analysis.get("analysis"),
+            "recommendation": llm_analysis.get("recommendation"),
+            "cache_hit": llm_analysis.get("cache_hit", False),
+        }
+    return event
+
+
+def _initial_state(
+    preferences: Dict[str, Any],
+    ai_config: Dict[str, Any],
+    timeframe: str,
+    symbols: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Build the workflow state a run starts from."""
+    return {
         "messages": [],
-        "current_step": "fetch_data",
-        "stock_data": {},
-        "processed_data": {},
+        "current_step": "analyze_symbol" if symbols else "discover_symbols",
+        "preferences": preferences,
+        "ai_config": ai_config,
+        "timeframe": timeframe,
+        "symbols": list(symbols or []),
         "analysis_results": {},
+        "symbol_errors": {},
         "strategy_results": {},
         "final_report": {},
         "errors": [],
     }
 
-    # Execute workflow using async API
-    final_state = await app.ainvoke(initial_state)
 
+def _build_response(
+    final_state: Dict[str, Any],
+    preferences: Dict[str, Any],
+    ai_config: Dict[str, Any],
+    timeframe: str,
+) -> Dict[str, Any]:
+    """Turn a finished workflow state into the API response."""
     if final_state["errors"]:
         return {"status": "error", "errors": final_state["errors"]}
 
     # Extract topStocks from strategy results
     top_stocks = final_state["strategy_results"].get("top_stocks", [])
 
+    # Report which LLM analyses were served from the analysis cache
+    llm_analyses = {
+        symbol: result["llm_analysis"]
+        for symbol, result in final_state["analysis_results"].items()
+        if "llm_analysis" in result
+    }
+    llm_cache_hits = [
+        symbol for symbol, llm_analysis in llm_analyses.items() if llm_analysis.get("cache_hit")
+    ]
+
     return {
         "status": "success",
         "topStocks": top_stocks,  # Include topStocks in the response
@@ -193,6 +383,12 @@ async def run_analysis(
         "metadata": {
             "aiConfig": ai_config,
             "preferences": preferences,
-            "timeframe": timeframe
+            "timeframe": timeframe,
+            "symbolErrors": final_state["symbol_errors"],
+            "llmCache": {
+                "hits": len(llm_cache_hits),
+                "misses": len(llm_analyses) - len(llm_cache_hits),
+                "cachedSymbols": llm_cache_hits
+            }
         }
     }